@@ -1,9 +1,17 @@
+from functools import lru_cache
 from pathlib import Path
 
 import streamlit as st
 
+readme = Path(__file__).resolve().parent / "README.md"
+
+@lru_cache(maxsize=1)
+def read_readme(path, modified):
+    # Read once per process, the modification time in the key picks up edits
+    return path.read_text()
+
 def landing_page(st):
-    st.markdown(Path("README.md").read_text())
+    st.markdown(read_readme(readme, readme.stat().st_mtime_ns))
 
 def entrypoint(st):
     st.set_page_config(layout="wide")
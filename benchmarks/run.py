@@ -0,0 +1,420 @@
+"""Benchmarks of the simulation and plotting hot paths.
+
+    python -m benchmarks.run                  # compare with the baseline
+    python -m benchmarks.run --save           # record a new baseline
+    python -m benchmarks.run -k simulate/     # only matching cases
+
+Every case reports the best wall time over a few repeats and the peak of
+traced memory of one extra run. A case regresses when either grows more
+than the threshold over the baseline, which makes the exit code 1. The
+import/ cases start a fresh interpreter for every page and also fail when
+they exceed the page's budget in `import_budgets`.
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+root = Path(__file__).resolve().parent.parent
+default_baseline = Path(__file__).resolve().parent / "baseline.json"
+# Shared machines swing by a third between runs, pass --threshold to tighten
+default_threshold = 0.5
+# Differences below these are noise whatever the ratio
+minimum_change = {"time": 1e-3, "peak": 2**20}
+# Seconds from a fresh interpreter to an imported page, startup included.
+# Charting libraries are imported by the plots, not at the top of the pages.
+import_budgets = {
+    "Home.py": 0.5,
+    "pages/01_Compound_Interest_Calculator.py": 0.75,
+    "pages/02_Fee_Recovery_Simulation.py": 0.75,
+    "pages/03_Flex_Term_vs_Fixed_Term.py": 0.75,
+    "pages/04_Inflation_Simulation.py": 0.75,
+    "pages/05_Asset_Profitability_Analyser.py": 1.5,
+}
+
+cases = {}
+
+
+def case(name, repeat=5):
+    # Registers a setup function returning the callable to measure, so that
+    # building inputs stays out of the timings
+    def register(setup):
+        cases[name] = (setup, repeat)
+        return setup
+
+    return register
+
+
+def load_page(name):
+    path = root / "pages" / name
+    spec = importlib.util.spec_from_file_location(f"page_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_page(path):
+    # What a cold server pays before the first rerun of the page
+    code = f"import runpy; runpy.run_path({str(path)!r})"
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=root, check=True, capture_output=True
+    )
+
+
+class Recorder:
+    # Stands in for streamlit, charts are serialized as they would be sent
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def columns(self, spec):
+        return [self] * (spec if isinstance(spec, int) else len(spec))
+
+    def checkbox(self, *args, **kwargs):
+        return False
+
+    def altair_chart(self, chart, **kwargs):
+        chart.to_dict()
+
+
+def price_history(years, seed=0):
+    generator = np.random.default_rng(seed)
+    days = years * 365
+    return 100 * np.exp(np.cumsum(generator.normal(0, 0.02, days)))
+
+
+for page in import_budgets:
+
+    @case(f"import/{page}", repeat=3)
+    def import_case(page=page):
+        return lambda: import_page(root / page)
+
+
+for frequency in ["Daily", "Weekly", "Monthly", "Annually"]:
+    for years in [1, 5, 15, 60]:
+
+        @case(f"simulate/{frequency.lower()}/{years}y")
+        def simulate_case(frequency=frequency, years=years):
+            from utils.common import simulate
+
+            return lambda: simulate(
+                1000.0, 1 + 0.15 / 365, frequency, "Monthly", years, 50.0
+            )
+
+
+@case("simulate_batch/1000_scenarios/5y", repeat=3)
+def simulate_batch_case():
+    from utils.common import simulate_batch
+
+    generator = np.random.default_rng(0)
+    frequencies = ["Annually", "Quarterly", "Monthly", "Biweekly", "Weekly", "Daily"]
+    arguments = (
+        generator.uniform(100, 100_000, 1000),
+        1 + generator.uniform(0, 0.2, 1000) / 365,
+        generator.choice(frequencies, 1000),
+        generator.choice(frequencies, 1000),
+        5,
+        generator.uniform(0, 500, 1000),
+    )
+    return lambda: simulate_batch(*arguments)
+
+
+for years in [15, 60]:
+
+    @case(f"simulate_batch/1000_scenarios/{years}y/daily/totals", repeat=3)
+    def simulate_batch_totals_case(years=years):
+        from utils.common import simulate_batch
+
+        generator = np.random.default_rng(0)
+        arguments = (
+            generator.uniform(100, 100_000, 1000),
+            1 + generator.uniform(0, 0.2, 1000) / 365,
+            "Daily",
+            "Monthly",
+            years,
+            generator.uniform(0, 500, 1000),
+        )
+        return lambda: simulate_batch(*arguments, resolution="totals")
+
+
+@case("simulate_batch/1000_scenarios/5y/monthly/events", repeat=3)
+def simulate_batch_events_case():
+    from utils.common import simulate_batch
+
+    generator = np.random.default_rng(0)
+    arguments = (
+        generator.uniform(100, 100_000, 1000),
+        1 + generator.uniform(0, 0.2, 1000) / 12,
+        "Monthly",
+        "Monthly",
+        5,
+        generator.uniform(0, 500, 1000),
+    )
+    return lambda: simulate_batch(*arguments, resolution="events")
+
+
+@case("simulate_fee/no_recovery", repeat=3)
+def simulate_fee_case():
+    from utils.fee import simulate_fee
+
+    # Half the capital lost to the fee is never recovered, every horizon runs
+    return lambda: simulate_fee(10_000.0, 0.5, True, 0.03 / 365, 0.002 / 365, 1, seed=0)
+
+
+@case("simulate_fee/no_recovery/float32", repeat=3)
+def simulate_fee_single_case():
+    from utils.fee import simulate_fee
+
+    return lambda: simulate_fee(
+        10_000.0, 0.5, True, 0.03 / 365, 0.002 / 365, 1, seed=0, dtype="float32"
+    )
+
+
+@case("simulate_fee/no_recovery/monthly/coarse", repeat=3)
+def simulate_fee_coarse_case():
+    from utils.fee import simulate_fee
+
+    return lambda: simulate_fee(
+        10_000.0, 0.5, True, 0.03 / 12, 0.002 / 12, 30, seed=0, coarse=True
+    )
+
+
+@case("simulate_inflation/15y", repeat=3)
+def simulate_inflation_case():
+    from utils.inflation import simulate_inflation
+
+    return lambda: simulate_inflation(10_000.0, 2.0, 2.5, 3.5, 15, False, seed=0)
+
+
+@case("simulate_inflation/15y/float32", repeat=3)
+def simulate_inflation_single_case():
+    from utils.inflation import simulate_inflation
+
+    return lambda: simulate_inflation(
+        10_000.0, 2.0, 2.5, 3.5, 15, False, seed=0, dtype="float32"
+    )
+
+
+@case("simulate_inflation/60y", repeat=1)
+def simulate_inflation_long_case():
+    from utils.inflation import simulate_inflation
+
+    return lambda: simulate_inflation(10_000.0, 2.0, 2.5, 3.5, 60, False, seed=0)
+
+
+@case("simulate_inflation/15y/analytic")
+def simulate_inflation_analytic_case():
+    from utils.inflation import simulate_inflation
+
+    return lambda: simulate_inflation(10_000.0, 2.0, 2.5, 3.5, 15, False, analytic=True)
+
+
+@case("show_metrics/20y")
+def show_metrics_case():
+    import pandas as pd
+
+    from utils.assets import profit_frame
+    from utils.streaks import streak_index
+
+    page = load_page("05_Asset_Profitability_Analyser.py")
+    prices = price_history(20)
+    history = pd.DataFrame(
+        {"Open": prices, "Close": prices},
+        index=pd.date_range("2000-01-01", periods=len(prices), name="Date"),
+    )
+    data = profit_frame(history, 30)
+
+    def show():
+        page.show_metrics(Recorder(), data, streak_index(data["percentage"].to_numpy()))
+
+    return show
+
+
+@case("horizon_metrics/20y/365", repeat=3)
+def horizon_metrics_case():
+    from utils.assets import horizon_metrics
+
+    prices = price_history(20)
+    return lambda: horizon_metrics(prices, np.arange(1, 366))
+
+
+@case("plot_compound/15y")
+def plot_compound_case():
+    from utils.common import simulate
+
+    page = load_page("01_Compound_Interest_Calculator.py")
+    *_, deposits, interests = simulate(
+        1000.0, 1 + 0.15 / 365, "Daily", "Monthly", 15, 50.0, extras=True
+    )
+    return lambda: page.plot_compound(Recorder(), deposits, interests, 1000.0, False)
+
+
+@case("plot_comparison/fee/15y")
+def plot_fee_case():
+    page = load_page("02_Fee_Recovery_Simulation.py")
+    median = 9000 * 1.0001 ** np.arange(15 * 366)
+    return lambda: page.plot_comparison(
+        Recorder(), 10_000.0, median, median * 0.99, median * 1.01
+    )
+
+
+@case("plot_comparison/flex_fixed/15y")
+def plot_flex_fixed_case():
+    page = load_page("03_Flex_Term_vs_Fixed_Term.py")
+    days = np.arange(15 * 365 + 1)
+    flex = 800 * 1.0003**days
+    fixed = 500 * 1.0004**days
+    return lambda: page.plot_comparison(Recorder(), flex, fixed, 1000)
+
+
+@case("plot_comparison/inflation/15y")
+def plot_inflation_case():
+    page = load_page("04_Inflation_Simulation.py")
+    median = 10_000 / 1.0001 ** np.arange(15 * 365)
+    return lambda: page.plot_comparison(
+        Recorder(), median, median * 0.99, median * 1.01
+    )
+
+
+@case("plot_profit/20y")
+def plot_profit_case():
+    import pandas as pd
+
+    from utils.assets import profit_frame
+
+    page = load_page("05_Asset_Profitability_Analyser.py")
+    prices = price_history(20)
+    history = pd.DataFrame(
+        {"Open": prices, "Close": prices},
+        index=pd.date_range("2000-01-01", periods=len(prices), name="Date"),
+    )
+    data = profit_frame(history, 30)
+    return lambda: page.plot_profit(Recorder(), data)
+
+
+def measure(setup, repeat):
+    from utils.cache import result_cache
+
+    function = setup()
+    function()
+
+    # Every run starts from an empty result cache, the cost of a cold rerun,
+    # and, as timeit does, without garbage collection pauses
+    times = []
+    for _ in range(repeat):
+        result_cache.clear()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    result_cache.clear()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time": min(times), "peak": peak}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in ["time", "peak"]:
+            change = result[metric] - reference[metric]
+            if (
+                change > reference[metric] * threshold
+                and change > minimum_change[metric]
+            ):
+                regressions.append((name, metric, reference[metric], result[metric]))
+
+    for page, budget in import_budgets.items():
+        result = results.get(f"import/{page}")
+        if result is not None and result["time"] > budget:
+            regressions.append((f"import/{page}", "budget", budget, result["time"]))
+
+    return regressions
+
+
+def format_bytes(size):
+    return f"{size / 2**20:.1f} MiB"
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("-k", "--filter", default="", help="substring of case names")
+    parser.add_argument("--baseline", type=Path, default=default_baseline)
+    parser.add_argument("--threshold", type=float, default=default_threshold)
+    parser.add_argument("--repeat", type=int, help="overrides the case repeats")
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parsed = parser.parse_args(arguments)
+
+    # The pages still use the deprecated selection API of Altair
+    warnings.simplefilter("ignore")
+
+    baseline = {}
+    if parsed.baseline.exists():
+        baseline = json.loads(parsed.baseline.read_text())["cases"]
+
+    results = {}
+    for name, (setup, repeat) in cases.items():
+        if parsed.filter not in name:
+            continue
+
+        results[name] = measure(setup, parsed.repeat or repeat)
+        result = results[name]
+
+        change = ""
+        if name in baseline:
+            ratio = result["time"] / baseline[name]["time"]
+            change = f"  {ratio:6.2f}x baseline"
+        print(
+            f"{name:45} {result['time'] * 1000:10.2f} ms"
+            f" {format_bytes(result['peak']):>12}{change}"
+        )
+
+    if parsed.save:
+        recorded = {"environment": environment(), "cases": {**baseline, **results}}
+        parsed.baseline.write_text(json.dumps(recorded, indent=2) + "\n")
+        return 0
+
+    regressions = compare(results, baseline, parsed.threshold)
+    for name, metric, reference, value in regressions:
+        print(
+            f"REGRESSION {name} {metric}: {reference:.6g} -> {value:.6g}",
+            file=sys.stderr,
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,7 @@
 import numpy as np
-import pandas as pd
-import altair as alt
-
 import streamlit as st
 
+from utils.instrument import instrumented, lap
 from utils.common import (
     interest_metrics,
     show_metrics,
@@ -15,22 +13,17 @@ from utils.common import (
     footer,
 )
 
-from utils.plotting import select_nearest, get_selectors, add_rules, mark_years, add_text
-
-st.set_page_config(
-    page_title="Hello",
-    layout="wide"
-)
+st.set_page_config(page_title="Hello", layout="wide")
 
 __description__ = """
 This app simulates compound interest, that is, investments that yield interests
 and whose interests are invested back to gain even more interest and thus
 producing exponential growth.
 
-The compounding could be configured to happen Annually, Monthly, or Daily, and
-it is also possible to specify recurrent deposits with the same or a different
-frequency as the compounding (e.g the compounding could be daily but the
-deposits monthly).
+The compounding could be configured to happen Annually, Quarterly, Monthly,
+Biweekly, Weekly or Daily, and it is also possible to specify recurrent
+deposits with the same or a different frequency as the compounding (e.g the
+compounding could be daily but the deposits monthly).
 
 This app is mostly focused on the ones wanting a passive income, therefore, at
 the end of the simulation the daily, monthly and annually interests are shown
@@ -49,6 +42,7 @@ inflation, check the Inflation Simulation app on the sidebar.
 """
 
 
+@instrumented("compound")
 def entrypoint(st, **state):
     st.title("Compound Interest Calculator")
     st.write(__description__)
@@ -64,11 +58,12 @@ def entrypoint(st, **state):
         recurring_frequency,
     ) = show_inputs(st, compound_frequency_options, recurring_frequency_options, "")
 
-    years_to_invest = st.slider("Years", min_value=1, max_value=15, value=2)
+    years_to_invest = st.slider("Years", min_value=1, max_value=60, value=2)
 
     zero_start = st.checkbox("Start at Zero", value=False)
 
     st.write("---")
+    lap("inputs")
 
     proportional_interest = (
         1 + apr_decimal / compounding_frequencies[compound_frequency]
@@ -91,6 +86,8 @@ def entrypoint(st, **state):
         extras=True,
     )
 
+    lap("simulate")
+
     st.write("### Simulation Results")
     st.write("#### Capital at the end")
 
@@ -121,10 +118,26 @@ def entrypoint(st, **state):
         total_capital,
     )
 
+    lap("metrics")
+
     plot_compound(st, deposits, interests, initial_capital, zero_start)
+    lap("plot")
 
 
 def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
+    # Altair and pandas take longer to import than the rest of the page, they
+    # are only loaded once the inputs and metrics are on screen
+    import altair as alt
+    import pandas as pd
+    from utils.plotting import (
+        select_nearest,
+        get_selectors,
+        add_rules,
+        mark_years,
+        add_text,
+        downsample_indices,
+    )
+
     lenght = len(deposits_)
 
     positions = np.arange(lenght)
@@ -133,40 +146,31 @@ def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
     deposits = initial_capital + np.array(deposits_)
     interests = deposits + np.array(interests_)
 
-    initial_coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, initial_capital)
-    ]
+    indices = downsample_indices([initial_capital, deposits, interests])
+    positions = positions[indices]
+    initial_capital = initial_capital[indices]
+    deposits, deposits_ = deposits[indices], np.asarray(deposits_)[indices]
+    interests, interests_ = interests[indices], np.asarray(interests_)[indices]
 
     initial_data = {
         "x": positions,
         "acummulated_value": initial_capital,
         "value": initial_capital,
         "type": "Initial Capital",
-        "coordinates": initial_coordinates,
     }
 
-    deposits_coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, deposits)
-    ]
-
     deposits_data = {
         "x": positions,
         "acummulated_value": deposits,
         "value": deposits_,
         "type": "Recurrent Deposits",
-        "coordinates": deposits_coordinates,
     }
 
-    interests_coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, interests)
-    ]
-
     interests_data = {
         "x": positions,
         "acummulated_value": interests,
         "value": interests_,
         "type": "Interests",
-        "coordinates": interests_coordinates,
     }
 
     initial_df = pd.DataFrame(initial_data)
@@ -180,7 +184,7 @@ def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
     lower_limit = 0 if zero_start else initial_capital_
 
     line = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_line()
         .encode(
             x=alt.X(
@@ -201,7 +205,7 @@ def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
 
     area_order = {"Initial Capital": 0, "Recurrent Deposits": 1, "Interests": 2}
     area = (
-        alt.Chart(df)
+        alt.Chart()
         .transform_calculate(order=f"{area_order}[datum.variable]")
         .mark_area()
         .encode(
@@ -214,14 +218,14 @@ def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
     )
 
     nearest = select_nearest()
-    selectors = get_selectors(df, nearest)
+    selectors = get_selectors(nearest)
     points = line.mark_point().transform_filter(nearest)
-    rules = add_rules(df, nearest)
-    years = mark_years(df)
-    text = add_text(line, "coordinates:N", nearest)
+    rules = add_rules(nearest)
+    years = mark_years(lenght)
+    text = add_text(line, "acummulated_value", nearest)
 
     chart = (
-        alt.layer(line, area, selectors, points, rules, text, years)
+        alt.layer(line, area, selectors, points, rules, text, years, data=df)
         .interactive()
         .properties(width=1600, height=500, title="Capital with Compound Interest")
         .configure_title(fontSize=24)
@@ -232,4 +236,4 @@ def plot_compound(st, deposits_, interests_, initial_capital_, zero_start):
 
 if __name__ == "__main__":
     entrypoint(st)
-    footer(st)
\ No newline at end of file
+    footer(st)
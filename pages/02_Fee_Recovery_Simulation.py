@@ -1,9 +1,9 @@
 import numpy as np
-import pandas as pd
-import altair as alt
 
+from utils.instrument import instrumented, lap
 from utils.common import compounding_frequencies, compound_frequency_options, footer
-from utils.plotting import select_nearest, get_selectors, add_rules, mark_years, add_text
+from utils.fee import recovery_days, simulate_fee
+from utils.sampling import sampling_methods
 
 import streamlit as st
 
@@ -19,20 +19,37 @@ noise helps to simulate non-fixed rates (e.g. value appreciation from ETFs), if
 the rate is fixed (e.g. in Fixed-Terms or Flex-Terms), the noise can be set to
 0.
 
-The interest can be optionally be compounded Annually, Monthly or Daily.
+The interest can be optionally be compounded Annually, Quarterly, Monthly,
+Biweekly, Weekly or Daily.
 
 The result is the minimum, median, and maximum number of days to recover what
-was paid as a fee.
+was paid as a fee, that is, the first day on which the 95%, 50% and 5% bands of
+the simulated capital get back the initial capital.
 
 The number of years to simulate will be automatically determined but it will
-fail if it is more than 15 years. Fees should be recovered much sooner most of
+fail if it is more than 60 years. Fees should be recovered much sooner most of
 the time.
 
+Each day draws its own rate, so the bands can also be computed exactly from the
+quantiles of the noise instead of running 5,000 simulations, enable "Analytic
+Bands" to do so.
+
+The capital only grows when interest is compounded, enable "Draw per Compounding
+Period" to draw one rate per period instead of one per day. The bands are the
+same but the simulations are much faster for Monthly or longer periods.
+
+The simulations can draw antithetic pairs or stratified samples to reduce the
+noise of the results, and with a tolerance greater than zero they run only as
+many simulations as needed for the bands to change less than that percentage.
+"Single Precision" simulates with 32-bit numbers, which is lighter on memory
+and moves the bands by less than the noise of the simulations themselves.
+
 This app does not include recurrent deposits, however the "Compound Interest"
 and the "Flex Term vs Fixed Term" apps do, check them in the sidebar.
 """
 
 
+@instrumented("fee_recovery")
 def entrypoint(st, **state):
     st.title("Fee Recovery Simulation")
     st.write(__description__)
@@ -54,10 +71,10 @@ def entrypoint(st, **state):
 
     apr = left.number_input("Annual Percentage Rate", value=3.0, min_value=0.0)
 
-    noise = right.number_input("± Noise", value=0.2)
+    noise = right.number_input("± Noise", value=0.2, min_value=0.0)
 
     compound_frequency = st.selectbox(
-        "Compound Frequency", compound_frequency_options.keys(), index=2
+        "Compound Frequency", compound_frequency_options.keys(), index=5
     )
 
     compound_frequency_value = compound_frequency_options[compound_frequency]
@@ -65,6 +82,18 @@ def entrypoint(st, **state):
     proportional_interest = apr / 100 / compounding_frequencies[compound_frequency]
     proportional_noise = noise / 100 / compounding_frequencies[compound_frequency]
 
+    analytic = st.checkbox("Analytic Bands", value=False)
+    coarse = st.checkbox("Draw per Compounding Period", value=False)
+
+    left, right = st.columns(2)
+    sampling = left.selectbox("Sampling", sampling_methods)
+    tolerance = right.number_input("Tolerance (%)", value=0.0, min_value=0.0, step=0.1)
+    tolerance = tolerance / 100 if tolerance else None
+    single = st.checkbox("Single Precision", value=False)
+    dtype = "float32" if single else "float64"
+
+    lap("inputs")
+
     st.write("## Simulation Results")
 
     median_capital, min_capital, max_capital, years = simulate_fee(
@@ -74,88 +103,68 @@ def entrypoint(st, **state):
         proportional_interest,
         proportional_noise,
         compound_frequency_value,
+        analytic,
+        sampling=sampling,
+        tolerance=tolerance,
+        coarse=coarse,
+        dtype=dtype,
     )
 
+    lap("simulate")
+
     if years == -1:
-        st.warning("The fee will not be recovered in more than 15 years")
+        st.warning("The fee will not be recovered in more than 60 years")
 
     st.write("### Fee Recovery")
 
-    minimum_difference = np.abs(initial_capital - max_capital)
-    minimum_time_to_recover = np.argmin(minimum_difference)
-
-    median_difference = np.abs(initial_capital - median_capital)
-    median_time_to_recover = np.argmin(median_difference)
-
-    maximum_difference = np.abs(initial_capital - min_capital)
-    maximum_time_to_recover = np.argmin(maximum_difference)
-
-    left, middle, right = st.columns(3)
-
-    left.metric("Minimum Time to Recover", f"{minimum_time_to_recover} days")
-    middle.metric("Median Time to Recover", f"{median_time_to_recover} days")
-    right.metric("Maximum Time to Recover", f"{maximum_time_to_recover} days")
-
-    plot_comparison(st, initial_capital, median_capital, min_capital, max_capital)
-
-
-def simulate_fee(
-    initial_capital_,
-    fee,
-    percentage,
-    proportional_interest,
-    noise,
-    compound_frequency_value,
-):
-    runs = 5_000
-
-    if percentage:
-        initial_capital = initial_capital_ * (1 - fee)
-    else:
-        initial_capital = initial_capital_ - fee
-
-    for years in [1, 2, 3, 5, 10, 15]:
-        days = years * 366
-
-        data = np.tile(initial_capital, (runs, days))
-
-        generator = np.random.default_rng()
-
-        interest_rate = 1 + (
-            proportional_interest + generator.normal(0, noise, size=(runs, days))
+    times_to_recover = [
+        f"{day} days" if day >= 0 else "Not recovered"
+        for day in recovery_days(
+            initial_capital, median_capital, min_capital, max_capital
         )
+    ]
 
-        exponent = np.arange(days) // compound_frequency_value + 1
-
-        rate_compound = (interest_rate) ** exponent
-
-        data *= rate_compound
+    left, middle, right = st.columns(3)
 
-        median_data = np.median(data, axis=0)
-        minimum_bound = np.quantile(data, 0.05, axis=0)
-        maximum_bound = np.quantile(data, 0.95, axis=0)
+    left.metric("Minimum Time to Recover", times_to_recover[0])
+    middle.metric("Median Time to Recover", times_to_recover[1])
+    right.metric("Maximum Time to Recover", times_to_recover[2])
 
-        if np.max(minimum_bound - initial_capital_) > 0:
-            return median_data, minimum_bound, maximum_bound, years
+    lap("metrics")
 
-    return median_data, minimum_bound, maximum_bound, -1
+    plot_comparison(st, initial_capital, median_capital, min_capital, max_capital)
+    lap("plot")
 
 
 def plot_comparison(st, initial_capital, median_capital, min_capital, max_capital):
-    lenght = len(median_capital)
+    import altair as alt
+    import pandas as pd
+    from utils.plotting import (
+        select_nearest,
+        get_selectors,
+        add_rules,
+        mark_years,
+        add_text,
+        downsample_indices,
+    )
 
-    positions = np.arange(lenght)
+    lenght = len(median_capital)
 
-    coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, median_capital)
-    ]
+    # The break-even day of the median is kept exact
+    break_even = np.flatnonzero(median_capital >= initial_capital)[:1]
+    indices = downsample_indices(
+        [median_capital, min_capital, max_capital], keep=break_even
+    )
+    positions = np.arange(lenght)[indices]
+    median_capital = median_capital[indices]
+    min_capital = min_capital[indices]
+    max_capital = max_capital[indices]
 
     data = {
         "x": positions,
         "median": median_capital,
         "minimal": min_capital,
         "maximum": max_capital,
-        "coordinates": np.array(coordinates),
     }
 
     df = pd.DataFrame(data)
@@ -163,7 +172,7 @@ def plot_comparison(st, initial_capital, median_capital, min_capital, max_capita
     axis = alt.Axis(labelFontSize=20, titleFontSize=22)
 
     line = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_line()
         .encode(
             x=alt.X(
@@ -177,17 +186,17 @@ def plot_comparison(st, initial_capital, median_capital, min_capital, max_capita
     )
 
     area = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_area()
         .encode(x="x", y="minimal:Q", y2="maximum:Q", opacity=alt.value(0.2))
     )
 
     nearest = select_nearest()
-    selectors = get_selectors(df, nearest)
+    selectors = get_selectors(nearest)
     points = line.mark_point().transform_filter(nearest)
-    text = add_text(line, "coordinates:N", nearest)
-    rules = add_rules(df, nearest)
-    years = mark_years(df)
+    text = add_text(line, "median", nearest)
+    rules = add_rules(nearest)
+    years = mark_years(lenght)
 
     initial_capital = (
         alt.Chart(pd.DataFrame({"y": [initial_capital]}))
@@ -196,7 +205,9 @@ def plot_comparison(st, initial_capital, median_capital, min_capital, max_capita
     )
 
     chart = (
-        alt.layer(line, area, selectors, points, rules, text, years, initial_capital)
+        alt.layer(
+            line, area, selectors, points, rules, text, years, initial_capital, data=df
+        )
         .interactive()
         .properties(width=1600, height=500, title="Capital with Compound Interest")
         .configure_title(fontSize=24)
@@ -204,6 +215,7 @@ def plot_comparison(st, initial_capital, median_capital, min_capital, max_capita
 
     st.altair_chart(chart, use_container_width=True)
 
+
 if __name__ == "__main__":
     entrypoint(st)
-    footer(st)
\ No newline at end of file
+    footer(st)
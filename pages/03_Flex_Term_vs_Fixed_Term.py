@@ -1,11 +1,10 @@
 import numpy as np
-import pandas as pd
-import altair as alt
-
 import streamlit as st
 
+from utils.instrument import instrumented, lap
 from utils.common import (
-    simulate,
+    simulate_batch,
+    compare_terms,
     compounding_frequencies,
     compound_frequency_options,
     recurring_frequency_options,
@@ -13,17 +12,16 @@ from utils.common import (
     footer,
 )
 
-from utils.plotting import select_nearest, get_selectors, add_rules, mark_years, add_text
-
 __description__ = """
 This application compares the capital evolution over time from a flex-term
 investment and a fixed-term investment. It is assumed that the rates are fixed
 and no noise is being considered.
 
 Both investments are compounded with a customizable compounding frequency
-(annually, monthly or daily), it is also possible to do recurrent deposits and
-have a customizable deposit frequency different from the compounding frequency
-(e.g interest compound daily but deposits monthly).
+(annually, quarterly, monthly, biweekly, weekly or daily), it is also possible
+to do recurrent deposits and have a customizable deposit frequency different
+from the compounding frequency (e.g interest compound daily but deposits
+monthly).
 
 The two investments are simulated and some summary metrics are provided as
 well. The best approach is not determined by the final capital but rather by
@@ -42,6 +40,7 @@ substract the estimated inflation rate from your APRs.
 """
 
 
+@instrumented("flex_fixed")
 def entrypoint(st, **state):
     st.title("Flex Term vs Fixed Term Comparison")
     st.write(__description__)
@@ -76,7 +75,7 @@ def entrypoint(st, **state):
         "initial_capital": 500.0,
         "apr": 15.0,
         "recurring_deposits": 50.0,
-        "compound_frequency_index": 1,
+        "compound_frequency_index": 2,
     }
     (
         fixed_initial_capital,
@@ -96,37 +95,27 @@ def entrypoint(st, **state):
         1 + fixed_apr_decimal / compounding_frequencies[fixed_compound_frequency]
     )
 
-    years_to_invest = st.slider("Years to Simulate", min_value=1, max_value=15, value=2)
+    years_to_invest = st.slider("Years to Simulate", min_value=1, max_value=60, value=2)
 
     st.write("---")
+    lap("inputs")
 
     (
-        flex_total_interest,
-        flex_total_deposists,
-        flex_total_capital,
-        flex_capital_over_time,
-    ) = simulate(
-        flex_initial_capital,
-        flex_proportional_interest,
-        flex_compound_frequency,
-        flex_recurring_frequency,
-        years_to_invest,
-        flex_recurring_deposits,
-    )
-    (
-        fixed_total_interest,
-        fixed_total_deposists,
-        fixed_total_capital,
-        fixed_capital_over_time,
-    ) = simulate(
-        fixed_initial_capital,
-        fixed_proportional_interest,
-        fixed_compound_frequency,
-        fixed_recurring_frequency,
+        (flex_total_interest, fixed_total_interest),
+        (flex_total_deposists, fixed_total_deposists),
+        (flex_total_capital, fixed_total_capital),
+        (flex_capital_over_time, fixed_capital_over_time),
+    ) = simulate_batch(
+        [flex_initial_capital, fixed_initial_capital],
+        [flex_proportional_interest, fixed_proportional_interest],
+        [flex_compound_frequency, fixed_compound_frequency],
+        [flex_recurring_frequency, fixed_recurring_frequency],
         years_to_invest,
-        fixed_recurring_deposits,
+        [flex_recurring_deposits, fixed_recurring_deposits],
     )
 
+    lap("simulate")
+
     st.write("### Simulation Results")
 
     left_results, right_results = st.columns(2)
@@ -142,18 +131,15 @@ def entrypoint(st, **state):
 
     st.write("#### Comparison")
 
-    best = "Fixed" if fixed_total_interest > flex_total_interest else "Flex"
-    amount = abs(fixed_total_interest - flex_total_interest)
-    proportion = max(fixed_total_interest, flex_total_interest) / min(
-        fixed_total_interest, flex_total_interest
+    best, amount, percentage, time_to_pass = (
+        value.item()
+        for value in compare_terms(
+            flex_total_interest,
+            fixed_total_interest,
+            flex_capital_over_time,
+            fixed_capital_over_time,
+        )
     )
-    percentage = (proportion - 1) * 100
-
-    difference = np.abs(flex_capital_over_time - fixed_capital_over_time)
-    time_to_pass = np.argmin(difference)
-
-    if time_to_pass == len(difference) - 2:
-        time_to_pass = 0
 
     st.write(
         f"The best one was the **{best}** alternative, yielding **${amount:.2f} ({percentage:.2f}%)** more than the alternative. It took {time_to_pass} days to match the alternative."
@@ -164,34 +150,43 @@ def entrypoint(st, **state):
     middle_right.metric("Difference (%)", f"{percentage:.2f}%")
     right.metric("Time to match", f"{time_to_pass} days")
 
+    lap("metrics")
+
     plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to_pass)
+    lap("plot")
 
 
 def plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to_pass):
+    import altair as alt
+    import pandas as pd
+    from utils.plotting import (
+        select_nearest,
+        get_selectors,
+        add_rules,
+        mark_years,
+        add_text,
+        downsample_indices,
+    )
+
     lenght = len(fixed_capital_over_time)
-    positions = np.arange(lenght)
 
-    flex_coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, flex_capital_over_time)
-    ]
+    indices = downsample_indices(
+        [flex_capital_over_time, fixed_capital_over_time], keep=[time_to_pass]
+    )
+    positions = np.arange(lenght)[indices]
+    flex_capital_over_time = flex_capital_over_time[indices]
+    fixed_capital_over_time = fixed_capital_over_time[indices]
 
     flex_data = {
         "x": positions,
-        "value": flex_capital_over_time + (np.ones(lenght) * 1e-10).cumsum(),
+        "value": flex_capital_over_time + (positions + 1) * 1e-10,
         "type": "Flex",
-        "coordinates": flex_coordinates,
     }
 
-    fixed_coordinates = [
-        f"({pos}, {value:.2f})"
-        for pos, value in zip(positions, fixed_capital_over_time)
-    ]
-
     fixed_data = {
         "x": positions,
-        "value": fixed_capital_over_time + (np.ones(lenght) * 1e-10).cumsum(),
+        "value": fixed_capital_over_time + (positions + 1) * 1e-10,
         "type": "Fixed",
-        "coordinates": fixed_coordinates,
     }
 
     flex_df = pd.DataFrame(flex_data)
@@ -202,7 +197,7 @@ def plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to
     axis = alt.Axis(labelFontSize=20, titleFontSize=22)
 
     line = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_line()
         .encode(
             x=alt.X(
@@ -217,10 +212,10 @@ def plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to
     )
 
     nearest = select_nearest()
-    selectors = get_selectors(df, nearest)
-    text = add_text(line, "coordinates:N", nearest)
-    rules = add_rules(df, nearest)
-    years = mark_years(df)
+    selectors = get_selectors(nearest)
+    text = add_text(line, "value", nearest)
+    rules = add_rules(nearest)
+    years = mark_years(lenght)
     points = line.mark_point().transform_filter(nearest)
 
     match_point = (
@@ -230,7 +225,7 @@ def plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to
     )
 
     chart = (
-        alt.layer(line, selectors, points, rules, text, years, match_point)
+        alt.layer(line, selectors, points, rules, text, years, match_point, data=df)
         .interactive()
         .properties(width=1600, height=500, title="Flex Term vs Fixed Term over Time")
         .configure_title(fontSize=24)
@@ -241,4 +236,4 @@ def plot_comparison(st, flex_capital_over_time, fixed_capital_over_time, time_to
 
 if __name__ == "__main__":
     entrypoint(st)
-    footer(st)
\ No newline at end of file
+    footer(st)
@@ -1,12 +1,10 @@
 import numpy as np
-import pandas as pd
-
-import altair as alt
-
 import streamlit as st
 
+from utils.instrument import instrumented, lap
 from utils.common import footer
-from utils.plotting import select_nearest, get_selectors, add_rules, mark_years, add_text
+from utils.inflation import simulate_inflation
+from utils.sampling import sampling_methods
 
 __description__ = """
 This application adjusts an initial capital for inflation. Inflation can be
@@ -17,12 +15,23 @@ The compounding frequency can be either annually (by default) or daily (with
 the checkbox marked), The results are similar but the interpretation of the
 rates are different when using daily compounding.
 
+Each day draws its own inflation rate, so the bands can also be computed exactly
+from the quantiles of the triangular distribution instead of running 5,000
+simulations, enable "Analytic Bands" to do so.
+
+The simulations can draw antithetic pairs or stratified samples to reduce the
+noise of the results, and with a tolerance greater than zero they run only as
+many simulations as needed for the bands to change less than that percentage.
+"Single Precision" simulates with 32-bit numbers, which is lighter on memory
+and moves the bands by less than the noise of the simulations themselves.
+
 This app does not consider any type of interest or gain, to check the effects
 of compounding interests, check the "Compound Interest" and the "Flex Term vs
 Fixed Term" apps in the sidebar.
 """
 
 
+@instrumented("inflation")
 def entrypoint(st, **state):
     st.title("Inflation Simulation")
     st.write(__description__)
@@ -48,14 +57,36 @@ def entrypoint(st, **state):
 
     daily_conpound = st.checkbox("Daily Compounding", value=False)
 
-    years = st.slider("Years", min_value=1, max_value=15, value=2)
+    years = st.slider("Years", min_value=1, max_value=60, value=2)
+
+    analytic = st.checkbox("Analytic Bands", value=False)
+
+    left, right = st.columns(2)
+    sampling = left.selectbox("Sampling", sampling_methods)
+    tolerance = right.number_input("Tolerance (%)", value=0.0, min_value=0.0, step=0.1)
+    tolerance = tolerance / 100 if tolerance else None
+    single = st.checkbox("Single Precision", value=False)
+    dtype = "float32" if single else "float64"
+
+    lap("inputs")
 
     st.write("## Simulation Results")
 
     median_capital, min_capital, max_capital = simulate_inflation(
-        initial_capital, optimistic, realistic, pessimistic, years, daily_conpound
+        initial_capital,
+        optimistic,
+        realistic,
+        pessimistic,
+        years,
+        daily_conpound,
+        analytic,
+        sampling=sampling,
+        tolerance=tolerance,
+        dtype=dtype,
     )
 
+    lap("simulate")
+
     st.write("### Capital at the End")
 
     left, middle, right = st.columns(3)
@@ -71,58 +102,37 @@ def entrypoint(st, **state):
         "Realistic Case", f"${median_capital[-1]:.2f}", f"-{median_delta:.2f}%"
     )
 
-    plot_comparison(st, median_capital, min_capital, max_capital)
+    lap("metrics")
 
+    plot_comparison(st, median_capital, min_capital, max_capital)
+    lap("plot")
 
-def simulate_inflation(
-    initial_capital, optimistic, realistic, pessimistic, years, daily_conpound
-):
-    runs = 5_000
-    days = years * 365
-    data = np.tile(initial_capital, (runs, days))
-
-    optimistic_rate = optimistic / 100
-    realistic_rate = realistic / 100
-    pessimistic_rate = pessimistic / 100
 
-    generator = np.random.default_rng()
-    rate = generator.triangular(
-        optimistic_rate, realistic_rate, pessimistic_rate, size=(runs, days)
+def plot_comparison(st, median_capital, min_capital, max_capital):
+    import altair as alt
+    import pandas as pd
+    from utils.plotting import (
+        select_nearest,
+        get_selectors,
+        add_rules,
+        mark_years,
+        add_text,
+        downsample_indices,
     )
 
-    # Kept as legacy formula
-    # interest_rate = rate if daily_conpound else rate * np.linspace(1, 365, days)
-    # exponent = np.arange(days) if daily_conpound else years
-
-    interest_rate = rate / 365 if daily_conpound else np.power(1 + rate, 1 / 365) - 1
-    exponent = np.arange(days)
-
-    rate_compound = (1 + interest_rate) ** exponent
-
-    data /= rate_compound
-
-    median_data = np.median(data, axis=0)
-    minimum_bound = np.quantile(data, 0.05, axis=0)
-    maximum_bound = np.quantile(data, 0.95, axis=0)
-
-    return median_data, minimum_bound, maximum_bound
-
-
-def plot_comparison(st, median_capital, min_capital, max_capital):
     lenght = len(median_capital)
 
-    positions = np.arange(lenght)
-
-    coordinates = [
-        f"({pos}, {value:.2f})" for pos, value in zip(positions, median_capital)
-    ]
+    indices = downsample_indices([median_capital, min_capital, max_capital])
+    positions = np.arange(lenght)[indices]
+    median_capital = median_capital[indices]
+    min_capital = min_capital[indices]
+    max_capital = max_capital[indices]
 
     data = {
         "x": positions,
         "median": median_capital,
         "minimal": min_capital,
         "maximum": max_capital,
-        "coordinates": np.array(coordinates),
     }
 
     df = pd.DataFrame(data)
@@ -130,7 +140,7 @@ def plot_comparison(st, median_capital, min_capital, max_capital):
     axis = alt.Axis(labelFontSize=20, titleFontSize=22)
 
     line = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_line()
         .encode(
             x=alt.X(
@@ -144,21 +154,21 @@ def plot_comparison(st, median_capital, min_capital, max_capital):
     )
 
     area = (
-        alt.Chart(df)
+        alt.Chart()
         .mark_area()
         .encode(x=alt.X("x"), y="minimal:Q", y2="maximum:Q", opacity=alt.value(0.2))
     )
 
     nearest = select_nearest()
-    selectors = get_selectors(df, nearest)
-    text = add_text(line, "coordinates:N", nearest)
-    rules = add_rules(df, nearest)
-    years = mark_years(df)
+    selectors = get_selectors(nearest)
+    text = add_text(line, "median", nearest)
+    rules = add_rules(nearest)
+    years = mark_years(lenght)
 
     points = line.mark_point().transform_filter(nearest)
 
     chart = (
-        alt.layer(line, area, selectors, points, rules, text, years)
+        alt.layer(line, area, selectors, points, rules, text, years, data=df)
         .interactive()
         .properties(
             width=1600, height=500, title="Real Value over Time Adjusted for Inflation"
@@ -168,6 +178,7 @@ def plot_comparison(st, median_capital, min_capital, max_capital):
 
     st.altair_chart(chart, use_container_width=True)
 
+
 if __name__ == "__main__":
     entrypoint(st)
-    footer(st)
\ No newline at end of file
+    footer(st)
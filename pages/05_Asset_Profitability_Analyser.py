@@ -1,12 +1,21 @@
 import numpy as np
 import pandas as pd
 
-import yfinance as yf
-
-import altair as alt
 import streamlit as st
 
+from utils.instrument import instrumented, lap
+from utils.assets import (
+    average_prices,
+    compare_assets,
+    horizon_metrics,
+    metric_labels,
+    profit_frame,
+    proportion_metrics,
+)
+from utils.cache import cached
 from utils.common import footer
+from utils.history import load_history
+from utils.streaks import streak_index
 
 st.set_page_config(
     page_title="Hello",
@@ -34,13 +43,24 @@ Remember: *"Past performance is no guarantee of future results"*
 """
 
 
+@instrumented("assets")
 def entrypoint(st, **state):
     st.title("Asset Profitability Analyser")
     st.write(__description__)
 
     st.write("### Input Parameters")
 
-    ticker = st.text_input("Ticker Name", max_chars=10, placeholder="Stocks like 'AAPL' or cryptos like 'BTC-USD'")
+    compare = st.checkbox("Compare Several Tickers")
+    if compare:
+        tickers = st.text_area(
+            "Ticker Names", placeholder="One per line or comma separated"
+        )
+    else:
+        ticker = st.text_input(
+            "Ticker Name",
+            max_chars=10,
+            placeholder="Stocks like 'AAPL' or cryptos like 'BTC-USD'",
+        )
     shift = st.number_input("Investment Time (days)", value=30, min_value=1)
 
     years_ = st.number_input("Years to Consider (0 for max)", value=2, min_value=0)
@@ -52,78 +72,137 @@ def entrypoint(st, **state):
         )
         return
 
-    data = get_data(ticker, shift, years)
+    lap("inputs")
 
-    show_metrics(st, data)
+    if compare:
+        table = get_comparison(tuple(tickers.replace(",", " ").split()), shift, years)
+        lap("simulate")
+        st.write("## Comparison")
+        st.dataframe(table)
+        lap("metrics")
+        return
+
+    try:
+        data = get_data(ticker, shift, years)
+    except ValueError as error:
+        # Raised for tickers that cannot name a directory of the store
+        st.warning(str(error))
+        return
+    streaks = get_streaks(ticker, shift, years)
+    lap("simulate")
+
+    show_metrics(st, data, streaks)
+    lap("metrics")
 
     plot_profit(st, data)
+    lap("plot")
 
+    if st.checkbox("Explore All Investment Times"):
+        longest = st.number_input(
+            "Longest Investment Time (days)", value=365, min_value=2, max_value=3650
+        )
+        horizons = get_horizons(ticker, years, longest)
+        if horizons.empty:
+            st.info("There are not enough prices to explore the investment times")
+            return
+        plot_horizons(st, horizons)
 
+
+# Quotes move during the day, keep them for 15 minutes only
+@cached(ttl=15 * 60)
 def get_data(ticker, shift, years):
-    ticker_data = yf.Ticker(ticker)
-    history = ticker_data.history(period=years)
-    history["average"] = history["Open"] + history["Close"] / 2
-    data = history["average"]
+    return profit_frame(load_history(ticker, years), shift)
 
-    shifted_data = data.shift(shift)
-    df = pd.DataFrame()
-    df.index = data.index
-    df["absolute"] = data - shifted_data
-    df["percentage"] = df["absolute"] / shifted_data * 100
 
-    df = df.dropna()
-    df = df.reset_index()
-    return df[-5000:]
+@cached(ttl=15 * 60)
+def get_comparison(tickers, shift, years):
+    return compare_assets(tickers, shift, years)
 
 
-def show_metrics(st, data_):
+@cached(ttl=15 * 60)
+def get_horizons(ticker, years, longest):
+    prices = average_prices(load_history(ticker, years)).to_numpy()
+    return horizon_metrics(prices, np.arange(1, min(longest, len(prices) - 1) + 1))
+
+
+@cached(ttl=15 * 60)
+def get_streaks(ticker, shift, years):
+    return streak_index(get_data(ticker, shift, years)["percentage"].to_numpy())
 
-    st.write("## Streak Information")
-    # Adapted from https://stackoverflow.com/a/57517727/7690767
-    data = data_["percentage"]
-    positive = np.clip(data, 0, 1).astype(bool).cumsum()
-    negative = np.clip(data, -1, 0).astype(bool).cumsum()
-
-    streaks = np.where(
-        data >= 0,
-        positive - np.maximum.accumulate(np.where(data <= 0, positive, 0)),
-        -negative + np.maximum.accumulate(np.where(data >= 0, negative, 0)),
-    )
 
-    positive_peaks = streaks[streaks > 0]
-    negative_peaks = -streaks[streaks < 0]
+def show_metrics(st, data_, streaks):
+    st.write("## Streak Information")
+    left, left_middle, right_middle, right = st.columns(4)
+    left.metric("Longest Positive Streak", f"{streaks.longest(1)} days")
+    left_middle.metric("Shortest Positive Streak", f"{streaks.shortest(1)} days")
+    right_middle.metric("Longest Negative Streak", f"{streaks.longest(-1)} days")
+    right.metric("Shortest Negative Streak", f"{streaks.shortest(-1)} days")
 
     left, left_middle, right_middle, right = st.columns(4)
-    left.metric("Longest Positive Streak", f"{np.max(positive_peaks, initial=0)} days")
+    left.metric("Mean Positive Streak", f"{streaks.mean(1):.1f} days")
     left_middle.metric(
-        "Shortest Positive Streak", f"{np.min(positive_peaks, initial=0)} days"
-    )
-    right_middle.metric(
-        "Longest Negative Streak", f"{np.max(negative_peaks, initial=0)} days"
-    )
-    right.metric(
-        "Shortest Negative Streak", f"{np.min(negative_peaks, initial=0)} days"
+        "Median Positive Streak", f"{streaks.percentile(1, 50):.1f} days"
     )
+    right_middle.metric("Mean Negative Streak", f"{streaks.mean(-1):.1f} days")
+    right.metric("Median Negative Streak", f"{streaks.percentile(-1, 50):.1f} days")
 
-    st.write("## Proportion Information")
+    if st.checkbox("Show Streak Lengths"):
+        plot_streaks(st, streaks)
 
-    average_positive = data[data > 0].mean()
-    average_positive = 0 if np.isnan(average_positive) else average_positive
-    average_negative = data[data < 0].mean()
-    average_negative = 0 if np.isnan(average_negative) else average_negative
-    median_positive = data[data > 0].median()
-    median_positive = 0 if np.isnan(median_positive) else median_positive
-    median_negative = data[data < 0].median()
-    median_negative = 0 if np.isnan(median_negative) else median_negative
+    metrics = {
+        label: value[0]
+        for label, value in proportion_metrics(
+            data_[["percentage"]].to_numpy(dtype=float)
+        ).items()
+    }
 
+    st.write("## Proportion Information")
     left, left_middle, right_middle, right = st.columns(4)
-    left.metric("Mean Percentage Profit", f"{average_positive:.2f}%")
-    left_middle.metric("Median Percentage Profit", f"{median_positive:.2f}%")
-    right_middle.metric("Mean Percentage Loss", f"{average_negative:.2f}%")
-    right.metric("Median Percentage Loss", f"{median_negative:.2f}%")
+    for column, label in zip(
+        [left, left_middle, right_middle, right], metric_labels[4:]
+    ):
+        column.metric(label, f"{metrics[label]:.2f}%")
+
+
+def plot_streaks(st, streaks):
+    import altair as alt
+
+    positive = streaks.histogram(1)
+    negative = streaks.histogram(-1)
+
+    data = pd.concat(
+        [
+            pd.DataFrame(
+                {"Length": np.arange(1, len(positive)), "Runs": positive[1:]}
+            ).assign(Streak="Positive"),
+            pd.DataFrame(
+                {"Length": np.arange(1, len(negative)), "Runs": negative[1:]}
+            ).assign(Streak="Negative"),
+        ]
+    )
+
+    color_scale = alt.Scale(
+        domain=["Positive", "Negative"], range=["forestgreen", "firebrick"]
+    )
+
+    bars = (
+        alt.Chart(data)
+        .mark_bar(opacity=0.6)
+        .encode(
+            x=alt.X("Length:Q", title="Streak Length (days)"),
+            y=alt.Y("Runs:Q", title="Number of Streaks", stack=None),
+            color=alt.Color("Streak:N", scale=color_scale),
+            tooltip=["Streak", "Length", "Runs"],
+        )
+        .properties(height=300, width=1600, title="Streak Lengths")
+    )
+
+    st.altair_chart(bars, use_container_width=True)
 
 
 def plot_profit(st, data):
+    import altair as alt
+
     chart_data = alt.Chart(data)
 
     color_condition = alt.condition(
@@ -147,7 +226,39 @@ def plot_profit(st, data):
 
     st.altair_chart(line, use_container_width=True)
 
+
+def plot_horizons(st, table):
+    import altair as alt
+
+    st.write("## All Investment Times")
+
+    metrics = table.drop(columns="Observations")
+    scaled = (metrics - metrics.min()) / (metrics.max() - metrics.min())
+
+    data = (
+        metrics.reset_index()
+        .melt(id_vars="Investment Time", var_name="Metric", value_name="Value")
+        .assign(Scaled=scaled.melt()["value"].fillna(0.5).values)
+    )
+
+    heatmap = (
+        alt.Chart(data)
+        .mark_rect()
+        .encode(
+            x=alt.X("Investment Time:O", title="Investment Time (days)"),
+            y=alt.Y("Metric:N", sort=list(metrics.columns), title=None),
+            color=alt.Color(
+                "Scaled:Q", scale=alt.Scale(scheme="redyellowgreen"), legend=None
+            ),
+            tooltip=["Investment Time", "Metric", alt.Tooltip("Value:Q", format=".2f")],
+        )
+        .properties(height=300, width=1600, title="Metrics per Investment Time")
+    )
+
+    st.altair_chart(heatmap, use_container_width=True)
+
+
 if __name__ == "__main__":
 
     entrypoint(st)
-    footer(st)
\ No newline at end of file
+    footer(st)
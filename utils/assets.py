@@ -0,0 +1,235 @@
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.history import load_history
+from utils.quantiles import chunk_width
+
+# Bounded so that a basket of a few hundred symbols does not open as many
+# connections to the data source at once
+default_fetch_workers = 8
+
+# Arrays the size of the returns matrix alive at the peak of horizon_metrics
+working_copies = 8
+
+metric_labels = [
+    "Longest Positive Streak",
+    "Shortest Positive Streak",
+    "Longest Negative Streak",
+    "Shortest Negative Streak",
+    "Mean Percentage Profit",
+    "Median Percentage Profit",
+    "Mean Percentage Loss",
+    "Median Percentage Loss",
+]
+
+
+def average_prices(history):
+    return history["Open"] + history["Close"] / 2
+
+
+def profit_frame(history, shift):
+    data = average_prices(history).rename("average")
+
+    shifted_data = data.shift(shift)
+    df = pd.DataFrame()
+    df.index = data.index
+    df["absolute"] = data - shifted_data
+    df["percentage"] = df["absolute"] / shifted_data * 100
+
+    df = df.dropna()
+    df = df.reset_index()
+    return df[-5000:]
+
+
+def pad_columns(series, fill):
+    length = max((len(values) for values in series), default=0)
+    matrix = np.full((length, len(series)), fill, dtype=float)
+    for column, values in enumerate(series):
+        matrix[: len(values), column] = values
+    return matrix
+
+
+def streak_matrix(data):
+    # Adapted from https://stackoverflow.com/a/57517727/7690767, every column
+    # is a ticker. Zero padding ends any streak without starting a new one.
+    positive = np.clip(data, 0, 1).astype(bool).cumsum(axis=0)
+    negative = np.clip(data, -1, 0).astype(bool).cumsum(axis=0)
+
+    return np.where(
+        data >= 0,
+        positive - np.maximum.accumulate(np.where(data <= 0, positive, 0), axis=0),
+        -negative + np.maximum.accumulate(np.where(data >= 0, negative, 0), axis=0),
+    )
+
+
+def run_ends(mask):
+    # Last row of every run of True values in each column
+    following = np.zeros_like(mask)
+    following[:-1] = mask[1:]
+    return mask & ~following
+
+
+def masked_extreme(reduction, values, mask):
+    # Columns without any selected value report 0
+    filler = -np.inf if reduction is np.max else np.inf
+    extreme = reduction(np.where(mask, values, filler), axis=0, initial=filler)
+    return np.where(np.isinf(extreme), 0, extreme).astype(int)
+
+
+def masked_statistics(data, mask):
+    selected = np.where(mask, data, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(selected, axis=0)
+        median = np.nanmedian(selected, axis=0)
+    return np.nan_to_num(mean), np.nan_to_num(median)
+
+
+def streak_metrics(data):
+    streaks = streak_matrix(np.nan_to_num(data))
+    positive_ends = run_ends(streaks > 0)
+    negative_ends = run_ends(streaks < 0)
+
+    return dict(
+        zip(
+            metric_labels[:4],
+            [
+                masked_extreme(np.max, streaks, positive_ends),
+                masked_extreme(np.min, streaks, positive_ends),
+                masked_extreme(np.max, -streaks, negative_ends),
+                masked_extreme(np.min, -streaks, negative_ends),
+            ],
+        )
+    )
+
+
+def proportion_metrics(data):
+    mean_positive, median_positive = masked_statistics(data, data > 0)
+    mean_negative, median_negative = masked_statistics(data, data < 0)
+
+    return dict(
+        zip(
+            metric_labels[4:],
+            [mean_positive, median_positive, mean_negative, median_negative],
+        )
+    )
+
+
+def asset_metrics(percentages):
+    return matrix_metrics(pad_columns(percentages, np.nan))
+
+
+def matrix_metrics(data):
+    # Columns are independent series, NaN marks the rows they do not cover
+    return {**streak_metrics(data), **proportion_metrics(data)}
+
+
+def fetch_profits(tickers, shift, years, source=None, workers=None):
+    source = load_history if source is None else source
+    workers = default_fetch_workers if workers is None else workers
+
+    def fetch(ticker):
+        try:
+            return profit_frame(source(ticker, years), shift), None
+        except Exception as error:
+            return None, str(error)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tickers)))) as pool:
+        return dict(zip(tickers, pool.map(fetch, tickers)))
+
+
+def compare_assets(tickers, shift, years, source=None, workers=None):
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+    tickers = [ticker for ticker in tickers if ticker]
+
+    profits = fetch_profits(tickers, shift, years, source, workers)
+
+    loaded = [ticker for ticker in tickers if profits[ticker][0] is not None]
+    percentages = [profits[ticker][0]["percentage"].to_numpy() for ticker in loaded]
+
+    table = pd.DataFrame(asset_metrics(percentages), index=pd.Index(loaded))
+    table["Observations"] = [len(values) for values in percentages]
+    table = table.reindex(pd.Index(tickers, name="Ticker"))
+    table = table.astype(
+        {label: "Int64" for label in metric_labels[:4] + ["Observations"]}
+    )
+    table["Error"] = [profits[ticker][1] for ticker in tickers]
+
+    return table
+
+
+def horizon_returns(prices, horizons, window=5000):
+    # Row t holds the return of buying h days before t for every horizon h.
+    # A single strided view over the NaN padded prices serves all horizons.
+    prices = np.asarray(prices, dtype=float)
+    horizons = np.asarray(horizons, dtype=np.intp)
+    longest = int(horizons.max())
+
+    padded = np.concatenate([np.full(longest, np.nan), prices])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, longest + 1)
+
+    current = windows[:, -1:]
+    bought = windows[:, longest - horizons]
+    returns = (current - bought) / bought * 100
+
+    # Same rows profit_frame keeps: the last `window` days with a return
+    rows = np.arange(len(prices))[:, None]
+    first = np.maximum(horizons, len(prices) - window)
+    returns[rows < first] = np.nan
+
+    return returns
+
+
+def horizon_block(prices, horizons, window):
+    returns = horizon_returns(prices, horizons, window)
+    metrics = matrix_metrics(returns)
+
+    observations = np.sum(~np.isnan(returns), axis=0)
+    with np.errstate(invalid="ignore"):
+        win_rate = np.sum(returns > 0, axis=0) / observations * 100
+
+    return pd.DataFrame(
+        {
+            "Win Rate": np.nan_to_num(win_rate),
+            **{
+                label: value
+                for label, value in metrics.items()
+                if not label.startswith("Shortest")
+            },
+            "Observations": observations,
+        },
+        index=pd.Index(horizons, name="Investment Time"),
+    )
+
+
+def horizon_metrics(prices, horizons, window=5000, budget=None):
+    # Column blocks of horizons keep the peak within the memory budget
+    prices = np.asarray(prices, dtype=float)
+    horizons = np.asarray(horizons, dtype=np.intp)
+
+    # Without two prices there is no return, the table keeps its columns
+    if len(prices) < 2 or not len(horizons):
+        return pd.DataFrame(
+            {
+                "Win Rate": np.empty(0),
+                **{
+                    label: np.empty(0, dtype=int if "Streak" in label else float)
+                    for label in metric_labels
+                    if not label.startswith("Shortest")
+                },
+                "Observations": np.empty(0, dtype=int),
+            },
+            index=pd.Index(horizons[:0], name="Investment Time"),
+        )
+
+    width = chunk_width(len(prices) * working_copies, budget)
+
+    return pd.concat(
+        [
+            horizon_block(prices, horizons[start : start + width], window)
+            for start in range(0, len(horizons), width)
+        ]
+    )
@@ -0,0 +1,522 @@
+"""Headless runner for the calculators behind the Streamlit apps.
+
+Reads scenarios from CSV or JSONL, one scenario per row, and streams one
+result row per scenario to CSV or Parquet without importing Streamlit or
+Altair, e.g.
+
+    python -m utils.batch compound scenarios.csv -o results.parquet
+
+Missing columns take the defaults of the apps, see `calculators`.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from utils.common import (
+    compare_terms,
+    compound_frequency_options,
+    compounding_frequencies,
+    simulate_batch,
+)
+from utils.fee import recovery_days, simulate_fee
+from utils.inflation import simulate_inflation
+
+default_chunk_size = 256
+
+
+def uncached(function):
+    # Batch scenarios rarely repeat, caching them would only evict the
+    # results of the interactive sessions
+    return getattr(function, "__wrapped__", function)
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in {"1", "true", "yes", "y"}
+    return bool(value)
+
+
+class Calculator(NamedTuple):
+    # Parameters map to their default, results to the type of their values
+    parameters: dict
+    results: dict
+    run: Callable
+
+
+def field_types(calculator):
+    # A None default (e.g. the seed) is parsed as an integer
+    return {
+        **{
+            name: int if default is None else type(default)
+            for name, default in calculator.parameters.items()
+        },
+        **calculator.results,
+    }
+
+
+def proportional_interest(apr, compound_frequency):
+    periods = np.array([compounding_frequencies[f] for f in compound_frequency])
+    return 1 + np.asarray(apr, dtype=float) / 100 / periods
+
+
+def recurring_frequency(recurring, compound):
+    return np.where(recurring == "Same as Compound", compound, recurring)
+
+
+def group_by_years(columns):
+    # Every simulate_batch call covers a single horizon
+    for years in np.unique(columns["years"]):
+        yield np.flatnonzero(columns["years"] == years), int(years)
+
+
+def run_compound(columns):
+    results = {
+        name: np.empty(len(columns["years"]))
+        for name in ["total_capital", "total_deposits", "total_interest"]
+    }
+
+    compound = columns["compound_frequency"]
+    recurring = recurring_frequency(columns["recurring_frequency"], compound)
+
+    # Only the totals are needed, scenarios sharing their frequencies are
+    # stepped together over the days they deposit or compound on alone
+    for rows, years in group_by_years(columns):
+        pairs = np.char.add(compound[rows], recurring[rows])
+        for pair in np.unique(pairs):
+            group = rows[pairs == pair]
+            (
+                results["total_interest"][group],
+                results["total_deposits"][group],
+                results["total_capital"][group],
+                _,
+            ) = uncached(simulate_batch)(
+                columns["initial_capital"][group],
+                proportional_interest(columns["apr"][group], compound[group]),
+                compound[group],
+                recurring[group],
+                years,
+                columns["recurring_deposits"][group],
+                resolution="totals",
+            )
+
+    return results
+
+
+def product_arguments(columns, product, rows):
+    compound = columns[f"{product}_compound_frequency"][rows]
+    return {
+        "initial_capital": columns[f"{product}_initial_capital"][rows],
+        "proportional_interest": proportional_interest(
+            columns[f"{product}_apr"][rows], compound
+        ),
+        "compound_frequency": compound,
+        "recurring_frequency": recurring_frequency(
+            columns[f"{product}_recurring_frequency"][rows], compound
+        ),
+        "recurring_deposits": columns[f"{product}_recurring_deposits"][rows],
+    }
+
+
+def run_flex_fixed(columns):
+    scenarios = len(columns["years"])
+    results = {}
+
+    for rows, years in group_by_years(columns):
+        flex = product_arguments(columns, "flex", rows)
+        fixed = product_arguments(columns, "fixed", rows)
+
+        # Both products of every scenario in a single batch
+        interest, deposits, capital, capital_over_time = uncached(simulate_batch)(
+            years_to_invest=years,
+            **{name: np.concatenate([flex[name], fixed[name]]) for name in flex},
+        )
+
+        flex, fixed = slice(0, len(rows)), slice(len(rows), None)
+        outputs = {
+            "flex_total_capital": capital[flex],
+            "flex_total_deposits": deposits[flex],
+            "flex_total_interest": interest[flex],
+            "fixed_total_capital": capital[fixed],
+            "fixed_total_deposits": deposits[fixed],
+            "fixed_total_interest": interest[fixed],
+        }
+        outputs.update(
+            zip(
+                ["best", "difference", "difference_percentage", "time_to_match"],
+                compare_terms(
+                    interest[flex],
+                    interest[fixed],
+                    capital_over_time[flex],
+                    capital_over_time[fixed],
+                ),
+            )
+        )
+
+        for name, values in outputs.items():
+            if name not in results:
+                results[name] = np.empty(scenarios, dtype=values.dtype)
+            results[name][rows] = values
+
+    return results
+
+
+def run_fee(columns):
+    results = {
+        name: np.empty(len(columns["fee"]), dtype=int)
+        for name in ["minimum_days", "median_days", "maximum_days"]
+    }
+
+    for row in range(len(columns["fee"])):
+        frequency = columns["compound_frequency"][row]
+        percentage = columns["percentage"][row]
+        fee = columns["fee"][row] / 100 if percentage else columns["fee"][row]
+
+        bands = uncached(simulate_fee)(
+            columns["initial_capital"][row],
+            fee,
+            percentage,
+            columns["apr"][row] / 100 / compounding_frequencies[frequency],
+            columns["noise"][row] / 100 / compounding_frequencies[frequency],
+            compound_frequency_options[frequency],
+            columns["analytic"][row],
+            seed=columns["seed"][row],
+            sampling=columns["sampling"][row],
+            coarse=columns["coarse"][row],
+            dtype=columns["dtype"][row],
+        )
+
+        (
+            results["minimum_days"][row],
+            results["median_days"][row],
+            results["maximum_days"][row],
+        ) = recovery_days(columns["initial_capital"][row], *bands[:3])
+
+    return results
+
+
+def run_inflation(columns):
+    results = {
+        name: np.empty(len(columns["years"]))
+        for name in ["optimistic_capital", "realistic_capital", "pessimistic_capital"]
+    }
+
+    for row in range(len(columns["years"])):
+        tolerance = columns["tolerance"][row]
+
+        median_capital, min_capital, max_capital = uncached(simulate_inflation)(
+            columns["initial_capital"][row],
+            columns["optimistic"][row],
+            columns["realistic"][row],
+            columns["pessimistic"][row],
+            columns["years"][row],
+            columns["daily_compound"][row],
+            columns["analytic"][row],
+            seed=columns["seed"][row],
+            sampling=columns["sampling"][row],
+            tolerance=tolerance / 100 if tolerance else None,
+            dtype=columns["dtype"][row],
+        )
+
+        results["optimistic_capital"][row] = max_capital[-1]
+        results["realistic_capital"][row] = median_capital[-1]
+        results["pessimistic_capital"][row] = min_capital[-1]
+
+    return results
+
+
+def run_assets(columns):
+    # pandas is only needed by this calculator
+    import pandas as pd
+
+    from utils.assets import compare_assets, metric_labels
+
+    results = {}
+    scenarios = len(columns["ticker"])
+
+    # Tickers sharing a window are fetched concurrently
+    for shift, years in set(zip(columns["shift"], columns["years"])):
+        rows = np.flatnonzero((columns["shift"] == shift) & (columns["years"] == years))
+        period = f"{years}y" if years else "max"
+        tickers = columns["ticker"][rows]
+        table = compare_assets(tickers, shift, period)
+        table = table.reindex([ticker.strip().upper() for ticker in tickers])
+
+        for label in metric_labels + ["Observations", "Error"]:
+            name = label.lower().replace(" ", "_")
+            if name not in results:
+                results[name] = np.full(scenarios, None, dtype=object)
+            values = table[label].to_numpy(dtype=object)
+            results[name][rows] = np.where(pd.isna(values), None, values)
+
+    return results
+
+
+calculators = {
+    "compound": Calculator(
+        {
+            "initial_capital": 1000.0,
+            "apr": 15.0,
+            "compound_frequency": "Daily",
+            "recurring_deposits": 50.0,
+            "recurring_frequency": "Monthly",
+            "years": 2,
+        },
+        dict.fromkeys(["total_capital", "total_deposits", "total_interest"], float),
+        run_compound,
+    ),
+    "flex_fixed": Calculator(
+        {
+            "flex_initial_capital": 800.0,
+            "flex_apr": 12.0,
+            "flex_compound_frequency": "Daily",
+            "flex_recurring_deposits": 30.0,
+            "flex_recurring_frequency": "Monthly",
+            "fixed_initial_capital": 500.0,
+            "fixed_apr": 15.0,
+            "fixed_compound_frequency": "Monthly",
+            "fixed_recurring_deposits": 50.0,
+            "fixed_recurring_frequency": "Monthly",
+            "years": 2,
+        },
+        {
+            **dict.fromkeys(
+                [
+                    f"{product}_total_{total}"
+                    for product in ["flex", "fixed"]
+                    for total in ["capital", "deposits", "interest"]
+                ],
+                float,
+            ),
+            "best": str,
+            "difference": float,
+            "difference_percentage": float,
+            "time_to_match": int,
+        },
+        run_flex_fixed,
+    ),
+    "fee": Calculator(
+        {
+            "initial_capital": 10_000.0,
+            "fee": 5.0,
+            "percentage": True,
+            "apr": 3.0,
+            "noise": 0.2,
+            "compound_frequency": "Daily",
+            "analytic": False,
+            "sampling": "Random",
+            "coarse": False,
+            "dtype": "float64",
+            "seed": None,
+        },
+        dict.fromkeys(["minimum_days", "median_days", "maximum_days"], int),
+        run_fee,
+    ),
+    "inflation": Calculator(
+        {
+            "initial_capital": 10_000.0,
+            "optimistic": 2.0,
+            "realistic": 2.5,
+            "pessimistic": 3.5,
+            "years": 2,
+            "daily_compound": False,
+            "analytic": False,
+            "sampling": "Random",
+            "tolerance": 0.0,
+            "dtype": "float64",
+            "seed": None,
+        },
+        dict.fromkeys(
+            ["optimistic_capital", "realistic_capital", "pessimistic_capital"], float
+        ),
+        run_inflation,
+    ),
+    "assets": Calculator(
+        {"ticker": "", "shift": 30, "years": 2},
+        # Named after utils.assets.metric_labels, not imported to keep pandas
+        # out of the other calculators
+        {
+            **dict.fromkeys(
+                [
+                    "longest_positive_streak",
+                    "shortest_positive_streak",
+                    "longest_negative_streak",
+                    "shortest_negative_streak",
+                ],
+                int,
+            ),
+            **dict.fromkeys(
+                [
+                    "mean_percentage_profit",
+                    "median_percentage_profit",
+                    "mean_percentage_loss",
+                    "median_percentage_loss",
+                ],
+                float,
+            ),
+            "observations": int,
+            "error": str,
+        },
+        run_assets,
+    ),
+}
+
+
+def parse_value(value, default):
+    if value is None or value == "":
+        return default
+    if isinstance(default, bool):
+        return parse_bool(value)
+    if isinstance(default, int):
+        return int(float(value))
+    if isinstance(default, float):
+        return float(value)
+    if default is None:
+        return int(value)
+    return str(value)
+
+
+def to_columns(calculator, scenarios):
+    columns = {}
+    for name, default in calculator.parameters.items():
+        values = [parse_value(scenario.get(name), default) for scenario in scenarios]
+        columns[name] = np.array(values, dtype=object if default is None else None)
+    return columns
+
+
+def run_scenarios(calculator, scenarios, chunk_size=None):
+    # One result dict per scenario with its inputs followed by the outputs,
+    # scenarios are simulated `chunk_size` at a time
+    if isinstance(calculator, str):
+        calculator = calculators[calculator]
+    chunk_size = default_chunk_size if chunk_size is None else chunk_size
+
+    # Pass-through fields are fixed by the first scenario, the outputs
+    # cannot add columns once the header or the schema is written
+    extra = None
+
+    scenarios = iter(scenarios)
+    while chunk := list(islice(scenarios, chunk_size)):
+        for scenario in chunk:
+            fields = [name for name in scenario if name not in calculator.parameters]
+            if extra is None:
+                extra = fields
+            unknown = [name for name in fields if name not in extra]
+            if unknown:
+                raise ValueError(
+                    f"Fields {unknown} are not in the first scenario, "
+                    "every scenario must share the same fields"
+                )
+
+        columns = to_columns(calculator, chunk)
+        results = calculator.run(columns)
+
+        # Every row has the same leading columns whatever the scenario set,
+        # other scenario fields (e.g. an id) are passed through
+        for row, scenario in enumerate(chunk):
+            values = {
+                **{name: values[row] for name, values in columns.items()},
+                **{
+                    name: value
+                    for name, value in scenario.items()
+                    if name not in calculator.parameters
+                },
+                **{name: values[row] for name, values in results.items()},
+            }
+            yield {
+                name: value.item() if isinstance(value, np.generic) else value
+                for name, value in values.items()
+            }
+
+
+def read_scenarios(path):
+    path = Path(path)
+    with open(path, newline="") as file:
+        if path.suffix in {".jsonl", ".ndjson"}:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def write_csv(rows, output):
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(row), restval="")
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def write_parquet(rows, path, chunk_size, calculator):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if isinstance(calculator, str):
+        calculator = calculators[calculator]
+    arrow_types = {float: pa.float64(), int: pa.int64(), bool: pa.bool_()}
+
+    # The schema comes from the calculator, a chunk with a column that is all
+    # None would otherwise type it as null for the whole file. Pass-through
+    # fields have no declared type and are stored as text, as in a CSV.
+    types = field_types(calculator)
+    schema = None
+    writer = None
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            if schema is None:
+                schema = pa.schema(
+                    (name, arrow_types.get(types.get(name, str), pa.string()))
+                    for name in chunk[0]
+                )
+                writer = pq.ParquetWriter(path, schema)
+            chunk = [
+                {
+                    name: value if name in types or value is None else str(value)
+                    for name, value in row.items()
+                }
+                for row in chunk
+            ]
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def run_file(calculator, source, destination="-", chunk_size=None):
+    chunk_size = default_chunk_size if chunk_size is None else chunk_size
+    rows = run_scenarios(calculator, read_scenarios(source), chunk_size)
+
+    if destination == "-":
+        write_csv(rows, sys.stdout)
+    elif Path(destination).suffix == ".parquet":
+        write_parquet(rows, destination, chunk_size, calculator)
+    else:
+        with open(destination, "w", newline="") as output:
+            write_csv(rows, output)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.batch", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("calculator", choices=calculators)
+    parser.add_argument("scenarios", help="CSV or JSONL file, one scenario per row")
+    parser.add_argument(
+        "-o", "--output", default="-", help="CSV or .parquet file, stdout by default"
+    )
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size)
+    parsed = parser.parse_args(arguments)
+
+    run_file(parsed.calculator, parsed.scenarios, parsed.output, parsed.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
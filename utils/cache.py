@@ -0,0 +1,159 @@
+import inspect
+import sys
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+import numpy as np
+
+
+def normalize(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value == 0:
+        return 0.0
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize(item)) for key, item in value.items()))
+    return value
+
+
+def freeze(value):
+    # Cached results are shared by every session, arrays are handed out
+    # read-only so that no caller can alter them for the rest
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            freeze(item)
+    return value
+
+
+def share(value):
+    # DataFrames cannot be made read-only, every caller gets its own copy of
+    # the cached one instead
+    if hasattr(value, "memory_usage"):
+        return value.copy()
+    return value
+
+
+def size_of(value, seen=None):
+    seen = set() if seen is None else seen
+    if isinstance(value, np.ndarray):
+        # A view keeps its whole base alive, views sharing it count it once
+        owner = value.base if isinstance(value.base, np.ndarray) else value
+        if id(owner) in seen:
+            return 0
+        seen.add(id(owner))
+        return max(value.nbytes, owner.nbytes)
+    if hasattr(value, "memory_usage"):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(size_of(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_entries=512, max_bytes=256 * 2**20, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self.discard(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value, ttl=None):
+        size = size_of(value)
+        if size > self.max_bytes:
+            return
+
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if key in self.entries:
+                self.discard(key)
+
+            self.entries[key] = (value, size, expires)
+            self.total_bytes += size
+
+            while (
+                len(self.entries) > self.max_entries
+                or self.total_bytes > self.max_bytes
+            ):
+                self.discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def discard(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+            }
+
+
+# One cache per server process, shared by every session and simulator
+result_cache = ResultCache()
+
+
+def cached(function=None, ttl=None, cache=None):
+    if function is None:
+        return lambda function: cached(function, ttl, cache)
+
+    signature = inspect.signature(function)
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        store = result_cache if cache is None else cache
+
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        key = (name, normalize(arguments.arguments))
+
+        try:
+            hit, value = store.get(key)
+        except TypeError:
+            return function(*args, **kwargs)
+
+        if hit:
+            return share(value)
+
+        value = freeze(function(*args, **kwargs))
+        store.put(key, value, ttl)
+        return share(value)
+
+    return wrapper
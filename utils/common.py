@@ -1,10 +1,24 @@
 from datetime import datetime, timedelta
+from functools import partial
 
 import numpy as np
 
-compounding_frequencies = {"Annually": 1, "Monthly": 12, "Daily": 365}
+from utils.cache import cached
+from utils.quantiles import chunk_width
+from utils.schedule import compile_schedule
 
-compound_frequency_options = {"Annually": 365, "Monthly": 30, "Daily": 1}
+compounding_frequencies = {
+    "Annually": 1,
+    "Quarterly": 4,
+    "Monthly": 12,
+    "Biweekly": 26,
+    "Weekly": 52,
+    "Daily": 365,
+}
+
+compound_frequency_options = {
+    frequency: 365 // periods for frequency, periods in compounding_frequencies.items()
+}
 
 recurring_frequency_options = ["Same as Compound"] + list(
     compound_frequency_options.keys()
@@ -14,29 +28,23 @@ recurring_frequency_options = ["Same as Compound"] + list(
 def interest_metrics(
     st, apr_decimal, compound_frequency, compounding_frequencies, total_capital
 ):
-    daily_interest = "N/A"
-    if compound_frequency in ["Daily"]:
-        daily_interest = (
-            1 + apr_decimal / compounding_frequencies["Daily"]
-        ) * total_capital - total_capital
-        daily_interest = f"${daily_interest:.2f}"
-
-    monthly_interest = "N/A"
-    if compound_frequency in ["Daily", "Monthly"]:
-        monthly_interest = (
-            1 + apr_decimal / compounding_frequencies["Monthly"]
-        ) * total_capital - total_capital
-        monthly_interest = f"${monthly_interest:.2f}"
-
-    annual_interest = "N/A"
-    if compound_frequency in ["Daily", "Monthly", "Annually"]:
-        annual_interest = (
-            1 + apr_decimal / compounding_frequencies["Annually"]
-        ) * total_capital - total_capital
-        annual_interest = f"${annual_interest:.2f}"
-
-    labels = ["Daily Interest", "Monthly Interest", "Annually Interest"]
-    values = [daily_interest, monthly_interest, annual_interest]
+    compounds_per_year = compounding_frequencies[compound_frequency]
+
+    labels = []
+    values = []
+    for period in ["Daily", "Monthly", "Annually"]:
+        periods_per_year = compounding_frequencies[period]
+
+        value = "N/A"
+        if compounds_per_year >= periods_per_year:
+            interest = (
+                1 + apr_decimal / periods_per_year
+            ) * total_capital - total_capital
+            value = f"${interest:.2f}"
+
+        labels.append(f"{period} Interest")
+        values.append(value)
+
     columns = st.columns(3)
     show_metrics(columns, labels, values)
 
@@ -49,8 +57,14 @@ def show_metrics(sts, labels, values):
 def check_date(frequency: str, today: datetime) -> bool:
     if frequency == "Daily":
         return True
+    elif frequency == "Weekly":
+        return today.weekday() == 0
+    elif frequency == "Biweekly":
+        return (today - datetime(1970, 1, 5)).days % 14 == 0
     elif frequency == "Monthly":
         return today.day == 1
+    elif frequency == "Quarterly":
+        return today.day == 1 and today.month in [1, 4, 7, 10]
     elif frequency == "Annually":
         return today.day == 31 and today.month == 12
 
@@ -78,7 +92,7 @@ def show_inputs(
     )
     apr_decimal = apr / 100
 
-    compound_frequency_ = defaults.get("compound_frequency_index", 2)
+    compound_frequency_ = defaults.get("compound_frequency_index", 5)
     compound_frequency = st.selectbox(
         f"{preffix} Compound Frequency",
         compound_frequency_options.keys(),
@@ -94,7 +108,7 @@ def show_inputs(
         value=recurring_deposits_,
     )
 
-    recurring_frequency_ = defaults.get("recurring_frequency_index", 2)
+    recurring_frequency_ = defaults.get("recurring_frequency_index", 3)
     recurring_frequency = st.selectbox(
         f"{preffix} Recurring Frequency",
         recurring_frequency_options,
@@ -122,14 +136,39 @@ def show_inputs(
     )
 
 
-def simulate(
+simulation_start = np.datetime64("2022-01-02")
+
+
+def simulation_days(years_to_invest):
+    final_date = np.datetime64(f"{2022 + years_to_invest}-01-02")
+    return int((final_date - simulation_start) / np.timedelta64(1, "D"))
+
+
+def event_steps(compound_frequency, recurring_frequency, days):
+    # Days on which the capital of any scenario can change, on every other
+    # day it keeps the value of the last of these before it. The first day
+    # is always one, it rounds the initial capital to cents.
+    frequencies = np.union1d(compound_frequency, recurring_frequency)
+    steps = [np.arange(min(days, 1))] + [
+        compile_schedule(frequency, simulation_start, days).indices
+        for frequency in frequencies
+    ]
+    return np.unique(np.concatenate(steps))
+
+
+def daily_positions(steps, days):
+    # Column of the event series holding the capital at the end of each day,
+    # column 0 is the initial capital
+    return np.concatenate([[0], np.searchsorted(steps, np.arange(days), "right")])
+
+
+def simulate_loop(
     initial_capital,
     proportional_interest,
     compound_frequency,
     recurring_frequency,
     years_to_invest,
     recurring_deposits,
-    extras=False,
 ):
     initial_date = datetime(2022, 1, 2)
 
@@ -165,18 +204,343 @@ def simulate(
 
     capital_over_time = np.array(capital_over_time)
 
+    return (
+        total_interest,
+        total_deposists,
+        total_capital,
+        capital_over_time,
+        deposits,
+        interests,
+    )
+
+
+# Doubles hold every whole cent only below this bound
+cents_limit = 2**52
+
+
+def round_cents(values):
+    # Same result as round(value, 2) per element. The product by 100 is itself
+    # rounded, so exact half-cent ties of it are settled with its error term.
+    scaled = values * 100
+    cents = np.rint(scaled)
+
+    offset = scaled - cents
+    ties = np.abs(offset) == 0.5
+    if ties.any():
+        tied = values[ties]
+        high = tied * (2**27 + 1.0)
+        high -= high - tied
+        error = (high * 100 - scaled[ties]) + (tied - high) * 100
+        direction = np.sign(offset[ties])
+        cents[ties] += np.where(np.sign(error) == direction, direction, 0)
+
+    np.clip(cents, -cents_limit, cents_limit, out=cents)
+    return cents.astype(np.int64)
+
+
+def compound_closed_form(initial_capital, multipliers, additions, out=None):
+    # capital[n] = growth[n] * (initial + sum(additions[k] / growth[k], k <= n))
+    growth = np.cumprod(multipliers, axis=1)
+    capital = np.cumsum(additions / growth, axis=1)
+    capital += initial_capital[:, None]
+    capital *= growth
+    return np.round(capital, 2, out=out)
+
+
+def step_cents(capital, multipliers, additions):
+    cents = np.empty(multipliers.shape, dtype=np.int64)
+    capital = capital.astype(float)
+    for step in range(len(multipliers)):
+        capital *= multipliers[step]
+        capital += additions[step]
+        cents[step] = round_cents(capital)
+        np.divide(cents[step], 100, out=capital)
+    return cents
+
+
+def step_rounded(capital, multipliers, additions):
+    # Few scenarios are dominated by NumPy call overhead, Python floats and
+    # round() step them with the exact same arithmetic
+    values = []
+    for multiplier, addition in zip(multipliers, additions):
+        capital = round(capital * multiplier + addition, 2)
+        values.append(capital)
+    return values
+
+
+def compound_cents(
+    initial_capital, multipliers, additions, out=None, chunk_size=4096, scalar_limit=32
+):
+    scenarios, days = multipliers.shape
+    if out is None:
+        out = np.empty((scenarios, days))
+
+    # Capital only changes on event days and the first day always rounds the
+    # initial capital, so the rounding recurrence is stepped over those alone
+    changes = (multipliers != 1).any(axis=0) | (additions != 0).any(axis=0)
+    events = np.union1d(0, np.flatnonzero(changes))
+    positions = np.searchsorted(events, np.arange(days), side="right") - 1
+
+    for start in range(0, scenarios, chunk_size):
+        rows = slice(start, start + chunk_size)
+        step_multipliers = multipliers[rows, events]
+        step_additions = additions[rows, events]
+
+        if len(step_multipliers) <= scalar_limit:
+            capital = np.array(
+                [
+                    step_rounded(*scenario)
+                    for scenario in zip(
+                        initial_capital[rows].tolist(),
+                        step_multipliers.tolist(),
+                        step_additions.tolist(),
+                    )
+                ]
+            )
+        else:
+            cents = step_cents(
+                initial_capital[rows],
+                np.ascontiguousarray(step_multipliers.T),
+                np.ascontiguousarray(step_additions.T),
+            )
+            capital = (cents / 100).T
+
+            # Runaway balances leave the exact cents range, step them as floats
+            inexact = (np.abs(cents) >= cents_limit).any(axis=0)
+            for row in np.flatnonzero(inexact):
+                capital[row] = step_rounded(
+                    float(initial_capital[rows][row]),
+                    step_multipliers[row].tolist(),
+                    step_additions[row].tolist(),
+                )
+
+        out[rows] = capital[:, positions]
+
+    return out
+
+
+compound_engines = {"closed_form": compound_closed_form, "cents": compound_cents}
+
+
+@cached
+def simulate_batch(
+    initial_capital,
+    proportional_interest,
+    compound_frequency,
+    recurring_frequency,
+    years_to_invest,
+    recurring_deposits,
+    extras=False,
+    engine="cents",
+    resolution="daily",
+    budget=None,
+):
+    # Simulated on the days something happens only, in blocks of those days
+    # that fit the memory budget. Resolution "events" returns the series at
+    # those days, see event_steps, "daily" fills in every day in between and
+    # "totals" keeps the start and the end alone, whatever the horizon.
+    (
+        initial_capital,
+        proportional_interest,
+        compound_frequency,
+        recurring_frequency,
+        recurring_deposits,
+    ) = (
+        np.ravel(array)
+        for array in np.broadcast_arrays(
+            np.asarray(initial_capital, dtype=float),
+            np.asarray(proportional_interest, dtype=float),
+            np.asarray(compound_frequency),
+            np.asarray(recurring_frequency),
+            np.asarray(recurring_deposits, dtype=float),
+        )
+    )
+
+    scenarios = initial_capital.size
+    days = simulation_days(years_to_invest)
+    steps = event_steps(compound_frequency, recurring_frequency, days)
+
+    # Step columns of every frequency, the blocks take their share of them
+    events = {
+        name: [
+            (
+                np.flatnonzero(frequencies == frequency),
+                np.searchsorted(
+                    steps, compile_schedule(frequency, simulation_start, days).indices
+                ),
+            )
+            for frequency in np.unique(frequencies)
+        ]
+        for name, frequencies in [
+            ("compound", compound_frequency),
+            ("recurring", recurring_frequency),
+        ]
+    }
+
+    capital = initial_capital
+    deposited = np.zeros(scenarios)
+    earned = np.zeros(scenarios)
+    blocks = [(capital[:, None], deposited[:, None], earned[:, None])]
+
+    # Five matrices of a column per step are alive in a block, only the
+    # capital, deposits and interests at its end carry over to the next one
+    block_steps = chunk_width(5 * scenarios, budget)
+
+    for start in range(0, len(steps), block_steps):
+        stop = min(start + block_steps, len(steps))
+
+        multipliers = np.ones((scenarios, stop - start))
+        for rows, columns in events["compound"]:
+            columns = columns[(columns >= start) & (columns < stop)] - start
+            multipliers[np.ix_(rows, columns)] = proportional_interest[rows, None]
+
+        additions = np.zeros((scenarios, stop - start))
+        for rows, columns in events["recurring"]:
+            columns = columns[(columns >= start) & (columns < stop)] - start
+            additions[np.ix_(rows, columns)] = recurring_deposits[rows, None]
+
+        block_capital = compound_engines[engine](capital, multipliers, additions)
+
+        # The running totals enter the first column so that the sums add up
+        # in the same order as over a single block
+        multipliers -= 1
+        multipliers[:, 0] *= capital
+        multipliers[:, 1:] *= block_capital[:, :-1]
+        multipliers[:, 0] += earned
+        block_interests = np.cumsum(multipliers, axis=1, out=multipliers)
+
+        additions[:, 0] += deposited
+        block_deposits = np.cumsum(additions, axis=1, out=additions)
+
+        capital = block_capital[:, -1]
+        deposited = block_deposits[:, -1]
+        earned = block_interests[:, -1]
+
+        if resolution == "totals":
+            continue
+        blocks.append((block_capital, block_deposits, block_interests))
+
+    if resolution == "totals":
+        blocks.append((capital[:, None], deposited[:, None], earned[:, None]))
+
+    capital_over_time, deposits, interests = (
+        np.concatenate(series, axis=1) for series in zip(*blocks)
+    )
+
+    if resolution == "daily":
+        positions = daily_positions(steps, days)
+        capital_over_time = capital_over_time[:, positions]
+        if extras:
+            deposits = deposits[:, positions]
+            interests = interests[:, positions]
+
+    # The totals are copied, as views they would keep the whole interest and
+    # deposit matrices alive in the result cache
+    simulation = (
+        interests[:, -1].copy(),
+        deposits[:, -1].copy(),
+        capital_over_time[:, -1].copy(),
+        capital_over_time,
+    )
+
     if not extras:
-        return total_interest, total_deposists, total_capital, capital_over_time
+        return simulation
 
-    return (
+    return simulation + (deposits, interests)
+
+
+def simulate_vectorized(
+    initial_capital,
+    proportional_interest,
+    compound_frequency,
+    recurring_frequency,
+    years_to_invest,
+    recurring_deposits,
+    engine="closed_form",
+):
+    (
         total_interest,
         total_deposists,
         total_capital,
         capital_over_time,
         deposits,
         interests,
+    ) = simulate_batch(
+        [initial_capital],
+        [proportional_interest],
+        [compound_frequency],
+        [recurring_frequency],
+        years_to_invest,
+        [recurring_deposits],
+        extras=True,
+        engine=engine,
     )
 
+    return (
+        float(total_interest[0]),
+        float(total_deposists[0]),
+        float(total_capital[0]),
+        capital_over_time[0],
+        deposits[0],
+        interests[0],
+    )
+
+
+simulation_engines = {
+    "loop": simulate_loop,
+    "vectorized": simulate_vectorized,
+    "cents": partial(simulate_vectorized, engine="cents"),
+}
+
+
+def simulate(
+    initial_capital,
+    proportional_interest,
+    compound_frequency,
+    recurring_frequency,
+    years_to_invest,
+    recurring_deposits,
+    extras=False,
+    engine="cents",
+):
+    simulation = simulation_engines[engine](
+        initial_capital,
+        proportional_interest,
+        compound_frequency,
+        recurring_frequency,
+        years_to_invest,
+        recurring_deposits,
+    )
+
+    if not extras:
+        return simulation[:4]
+
+    return simulation
+
+
+def compare_terms(
+    flex_total_interest,
+    fixed_total_interest,
+    flex_capital_over_time,
+    fixed_capital_over_time,
+):
+    # Works on single scenarios and on batches, one row per scenario
+    flex_total_interest = np.asarray(flex_total_interest)
+    fixed_total_interest = np.asarray(fixed_total_interest)
+
+    best = np.where(fixed_total_interest > flex_total_interest, "Fixed", "Flex")
+    amount = np.abs(fixed_total_interest - flex_total_interest)
+    proportion = np.maximum(fixed_total_interest, flex_total_interest) / np.minimum(
+        fixed_total_interest, flex_total_interest
+    )
+    percentage = (proportion - 1) * 100
+
+    difference = np.abs(flex_capital_over_time - fixed_capital_over_time)
+    time_to_pass = np.argmin(difference, axis=-1)
+    time_to_pass = np.where(time_to_pass == difference.shape[-1] - 2, 0, time_to_pass)
+
+    return best, amount, percentage, time_to_pass
+
 
 def footer(st):
     snippet = """
@@ -0,0 +1,189 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+# Daily bars are stored once per ticker as plain .npy columns that are memory
+# mapped on load, a refresh only downloads the bars after the last stored day
+default_store = Path(
+    os.environ.get(
+        "FINANCE_TOOLS_HISTORY", Path.home() / ".cache" / "finance-tools" / "history"
+    )
+)
+refresh_interval = timedelta(hours=1)
+
+columns = ["Open", "Close"]
+# The leading character keeps "." and ".." out, they would name the store
+# itself or its parent
+ticker_pattern = re.compile(r"^[A-Z0-9^][A-Z0-9.^=_-]{0,15}$")
+
+ticker_locks = {}
+ticker_locks_lock = Lock()
+
+
+def yahoo_fetcher(ticker, start=None):
+    import yfinance as yf
+
+    ticker_data = yf.Ticker(ticker)
+    if start is None:
+        return ticker_data.history(period="max")
+    return ticker_data.history(start=str(start))
+
+
+def csv_fetcher(directory):
+    # Offline source, one <TICKER>.csv per ticker with Date, Open and Close
+    directory = Path(directory)
+
+    def fetch(ticker, start=None):
+        path = directory / f"{ticker}.csv"
+        if not path.exists():
+            return pd.DataFrame(columns=columns)
+
+        history = pd.read_csv(path, index_col="Date", parse_dates=True)
+        if start is not None:
+            history = history[history.index >= pd.Timestamp(start)]
+        return history
+
+    return fetch
+
+
+def default_fetcher():
+    fixtures = os.environ.get("FINANCE_TOOLS_FIXTURES")
+    return csv_fetcher(fixtures) if fixtures else yahoo_fetcher
+
+
+def ticker_directory(ticker, store=None):
+    ticker = ticker.strip().upper()
+    if not ticker_pattern.match(ticker):
+        raise ValueError(f"Invalid ticker: {ticker!r}")
+
+    store = Path(default_store if store is None else store).resolve()
+    directory = (store / ticker).resolve()
+    if directory.parent != store:
+        raise ValueError(f"Invalid ticker: {ticker!r}")
+
+    return directory
+
+
+def ticker_lock(directory):
+    # Refreshes of the same ticker are serialized, different tickers are
+    # fetched concurrently
+    with ticker_locks_lock:
+        return ticker_locks.setdefault(directory, Lock())
+
+
+def read_columns(directory):
+    if not (directory / "dates.npy").exists():
+        return None
+
+    return {
+        name: np.load(directory / f"{name}.npy", mmap_mode="r")
+        for name in ["dates"] + columns
+    }
+
+
+def write_columns(directory, stored):
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Written next to the old files and swapped in, so that readers holding
+    # a memory map never see a half written column
+    for name, values in stored.items():
+        temporary = directory / f"{name}.tmp.npy"
+        np.save(temporary, np.ascontiguousarray(values))
+        os.replace(temporary, directory / f"{name}.npy")
+
+
+def read_metadata(directory):
+    path = directory / "metadata.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def write_metadata(directory, metadata):
+    temporary = directory / "metadata.tmp.json"
+    temporary.write_text(json.dumps(metadata))
+    os.replace(temporary, directory / "metadata.json")
+
+
+def to_columns(history):
+    dates = pd.DatetimeIndex(history.index)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+
+    return {
+        "dates": dates.values.astype("datetime64[D]"),
+        **{name: history[name].to_numpy(dtype=np.float64) for name in columns},
+    }
+
+
+def refresh(ticker, store=None, fetcher=None, now=None):
+    fetcher = default_fetcher() if fetcher is None else fetcher
+    now = datetime.now() if now is None else now
+    directory = ticker_directory(ticker, store)
+
+    with ticker_lock(directory):
+        stored = read_columns(directory)
+        metadata = read_metadata(directory)
+
+        fetched_at = metadata.get("fetched_at")
+        if (
+            stored is not None
+            and fetched_at is not None
+            and now - datetime.fromisoformat(fetched_at) < refresh_interval
+        ):
+            return stored
+
+        if stored is None or not len(stored["dates"]):
+            fetched = to_columns(fetcher(directory.name))
+            merged = fetched
+        else:
+            # The last stored bar is fetched again, it may still have been
+            # trading when it was stored
+            last = stored["dates"][-1]
+            fetched = to_columns(fetcher(directory.name, start=last))
+            keep = np.searchsorted(stored["dates"], fetched["dates"][:1])
+            keep = int(keep[0]) if len(keep) else len(stored["dates"])
+            merged = {
+                name: np.concatenate([stored[name][:keep], fetched[name]])
+                for name in stored
+            }
+
+        write_columns(directory, merged)
+        write_metadata(directory, {"fetched_at": now.isoformat()})
+
+        return read_columns(directory)
+
+
+def window_start(years, now):
+    if years == "max":
+        return None
+
+    years = int(str(years).rstrip("y"))
+    return np.datetime64(
+        pd.Timestamp(now).normalize() - pd.DateOffset(years=years), "D"
+    )
+
+
+def load_history(ticker, years="max", store=None, fetcher=None, now=None):
+    if not ticker.strip():
+        return pd.DataFrame(
+            {name: np.empty(0) for name in columns},
+            index=pd.DatetimeIndex([], name="Date"),
+        )
+
+    now = datetime.now() if now is None else now
+    stored = refresh(ticker, store, fetcher, now)
+
+    start = window_start(years, now)
+    first = 0 if start is None else np.searchsorted(stored["dates"], start)
+
+    return pd.DataFrame(
+        {name: stored[name][first:] for name in columns},
+        index=pd.DatetimeIndex(stored["dates"][first:], name="Date"),
+    )
@@ -0,0 +1,127 @@
+from functools import partial
+
+import numpy as np
+
+from utils.cache import cached
+from utils.parallel import sharded_sampler
+from utils.quantiles import adaptive_runs, stream_quantiles, triangular_quantile
+from utils.sampling import draw_triangular
+
+
+@cached
+def simulate_inflation(
+    initial_capital,
+    optimistic,
+    realistic,
+    pessimistic,
+    years,
+    daily_conpound,
+    analytic=False,
+    seed=None,
+    workers=None,
+    sampling="Random",
+    tolerance=None,
+    dtype="float64",
+):
+    runs = 5_000
+    days = years * 365
+
+    optimistic_rate = optimistic / 100
+    realistic_rate = realistic / 100
+    pessimistic_rate = pessimistic / 100
+
+    if analytic:
+        return inflation_bands(
+            initial_capital,
+            optimistic_rate,
+            realistic_rate,
+            pessimistic_rate,
+            days,
+            daily_conpound,
+        )
+
+    sample = sharded_sampler(
+        partial(
+            sample_inflation,
+            initial_capital=initial_capital,
+            optimistic_rate=optimistic_rate,
+            realistic_rate=realistic_rate,
+            pessimistic_rate=pessimistic_rate,
+            daily_conpound=daily_conpound,
+            sampling=sampling,
+        ),
+        seed,
+        workers=workers,
+    )
+
+    if tolerance is not None:
+        runs = adaptive_runs(sample, days, [0.5, 0.05, 0.95], tolerance)
+
+    median_data, minimum_bound, maximum_bound = stream_quantiles(
+        sample, runs, 0, days, [0.5, 0.05, 0.95], dtype=dtype, workers=workers
+    )
+
+    return median_data, minimum_bound, maximum_bound
+
+
+def sample_inflation(
+    data,
+    start,
+    stop,
+    generator,
+    initial_capital,
+    optimistic_rate,
+    realistic_rate,
+    pessimistic_rate,
+    daily_conpound,
+    sampling="Random",
+):
+    draw_triangular(
+        data, generator, sampling, optimistic_rate, realistic_rate, pessimistic_rate
+    )
+
+    # Kept as legacy formula
+    # interest_rate = rate if daily_conpound else rate * np.linspace(1, 365, days)
+    # exponent = np.arange(days) if daily_conpound else years
+
+    # initial_capital / (1 + interest_rate) ** day, with interest_rate =
+    # rate / 365 when compounding daily and (1 + rate) ** (1 / 365) - 1
+    # otherwise, fused in log space: initial_capital * exp(-day * log(...)).
+    # In float64 the bands move less than 1e-12 relative to the power form.
+    if daily_conpound:
+        data /= 365
+        np.log1p(data, out=data)
+    else:
+        np.log1p(data, out=data)
+        data /= 365
+
+    data *= -np.arange(start, stop, dtype=data.dtype)
+    np.exp(data, out=data)
+    data *= initial_capital
+
+
+def inflation_bands(
+    initial_capital,
+    optimistic_rate,
+    realistic_rate,
+    pessimistic_rate,
+    days,
+    daily_conpound,
+):
+    # The real value on a day is decreasing in that day's rate, so its q
+    # quantile is the value at the 1 - q rate quantile. These are the exact
+    # bands the simulation estimates, whose 5,000 runs leave a standard error
+    # of about day / 365 * sqrt(q * (1 - q) / 5000) / f relative to the value,
+    # with f the triangular density at that rate quantile.
+    rate = triangular_quantile(
+        [0.5, 0.95, 0.05], optimistic_rate, realistic_rate, pessimistic_rate
+    )
+
+    interest_rate = rate / 365 if daily_conpound else np.power(1 + rate, 1 / 365) - 1
+    exponent = np.arange(days)
+
+    median_data, minimum_bound, maximum_bound = (
+        initial_capital / (1 + interest_rate[:, None]) ** exponent
+    )
+
+    return median_data, minimum_bound, maximum_bound
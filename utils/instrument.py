@@ -0,0 +1,200 @@
+"""Per-rerun stage timings of the apps, off unless enabled by environment.
+
+    FINANCE_TOOLS_PROFILE=reruns.jsonl   one JSON record per rerun
+    FINANCE_TOOLS_PROFILE=metrics.prom   Prometheus text file with totals
+    FINANCE_TOOLS_PROFILE_MEMORY=1       also trace allocations per stage
+    FINANCE_TOOLS_PROFILE_STACKS=x.txt   sampling profiler, folded stacks
+    FINANCE_TOOLS_PROFILE_INTERVAL=0.005 seconds between samples
+
+Every record also carries the hit, miss and eviction counts of the shared
+result cache at the end of the rerun.
+
+Pages decorate their entrypoint with `instrumented(page)` and call
+`lap(stage)` at the end of every stage, the time since the previous lap
+is attributed to that stage.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from functools import wraps
+from pathlib import Path
+
+from utils.cache import result_cache
+
+profile_path = os.environ.get("FINANCE_TOOLS_PROFILE")
+trace_memory = os.environ.get("FINANCE_TOOLS_PROFILE_MEMORY") == "1"
+stacks_path = os.environ.get("FINANCE_TOOLS_PROFILE_STACKS")
+sample_interval = float(os.environ.get("FINANCE_TOOLS_PROFILE_INTERVAL", 0.005))
+
+enabled = bool(profile_path or stacks_path)
+
+current = threading.local()
+output_lock = threading.Lock()
+# Prometheus totals per (page, stage): [count, seconds, allocated bytes]
+totals = defaultdict(lambda: [0, 0.0, 0])
+
+
+class Sampler(threading.Thread):
+    # Snapshots the stack of the rerun thread at a fixed interval, good
+    # enough to find the hot function without slowing the rerun down
+    def __init__(self, thread_id):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(sample_interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+def lap(stage):
+    if not enabled:
+        return
+
+    record = getattr(current, "record", None)
+    if record is None:
+        return
+
+    now = time.perf_counter()
+    entry = {"stage": stage, "time": now - record["last"]}
+    if trace_memory:
+        allocated, peak = tracemalloc.get_traced_memory()
+        entry["allocated"] = allocated - record["allocated"]
+        entry["peak"] = peak
+        record["allocated"] = allocated
+        tracemalloc.reset_peak()
+
+    record["stages"].append(entry)
+    record["last"] = time.perf_counter()
+
+
+def write_jsonl(record):
+    with output_lock, open(profile_path, "a") as output:
+        output.write(json.dumps(record) + "\n")
+
+
+def write_prometheus(record):
+    with output_lock:
+        for entry in record["stages"]:
+            total = totals[record["page"], entry["stage"]]
+            total[0] += 1
+            total[1] += entry["time"]
+            total[2] += entry.get("allocated", 0)
+
+        lines = ["# TYPE finance_tools_stage_seconds summary"]
+        if trace_memory:
+            lines.append("# TYPE finance_tools_stage_allocated_bytes counter")
+        for (page, stage), (count, seconds, allocated) in sorted(totals.items()):
+            labels = f'page="{page}",stage="{stage}"'
+            lines += [
+                f"finance_tools_stage_seconds_count{{{labels}}} {count}",
+                f"finance_tools_stage_seconds_sum{{{labels}}} {seconds:.6f}",
+            ]
+            if trace_memory:
+                lines.append(
+                    f"finance_tools_stage_allocated_bytes{{{labels}}} {allocated}"
+                )
+
+        # The result cache is shared by the whole process, not per page
+        cache = record["cache"]
+        lines += [
+            "# TYPE finance_tools_cache_hits_total counter",
+            f"finance_tools_cache_hits_total {cache['hits']}",
+            "# TYPE finance_tools_cache_misses_total counter",
+            f"finance_tools_cache_misses_total {cache['misses']}",
+            "# TYPE finance_tools_cache_evictions_total counter",
+            f"finance_tools_cache_evictions_total {cache['evictions']}",
+            "# TYPE finance_tools_cache_entries gauge",
+            f"finance_tools_cache_entries {cache['entries']}",
+            "# TYPE finance_tools_cache_bytes gauge",
+            f"finance_tools_cache_bytes {cache['bytes']}",
+        ]
+
+        # Replaced at once so that a scraper never reads half a file
+        temporary = f"{profile_path}.tmp"
+        Path(temporary).write_text("\n".join(lines) + "\n")
+        os.replace(temporary, profile_path)
+
+
+def write_stacks(page, stacks):
+    with output_lock, open(stacks_path, "a") as output:
+        for stack, count in stacks.items():
+            output.write(f"{page};{stack} {count}\n")
+
+
+def finish(record, sampler):
+    # Whatever ran after the last lap, e.g. after an early return
+    lap("rest")
+    record["total"] = time.perf_counter() - record["start"]
+    record["cache"] = result_cache.stats()
+    del record["last"], record["start"], record["allocated"]
+
+    if sampler is not None:
+        write_stacks(record["page"], sampler.stop())
+
+    if not profile_path:
+        return
+    if profile_path.endswith(".prom"):
+        write_prometheus(record)
+    else:
+        write_jsonl(record)
+
+
+def instrumented(page):
+    def decorator(entrypoint):
+        if not enabled:
+            return entrypoint
+
+        @wraps(entrypoint)
+        def wrapper(*args, **kwargs):
+            if trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                # Otherwise the first stage reports the peak of the last rerun
+                tracemalloc.reset_peak()
+
+            start = time.perf_counter()
+            current.record = {
+                "page": page,
+                "timestamp": time.time(),
+                "thread": threading.current_thread().name,
+                "stages": [],
+                "start": start,
+                "last": start,
+                "allocated": tracemalloc.get_traced_memory()[0] if trace_memory else 0,
+            }
+
+            sampler = None
+            if stacks_path:
+                sampler = Sampler(threading.get_ident())
+                sampler.start()
+
+            try:
+                return entrypoint(*args, **kwargs)
+            finally:
+                try:
+                    finish(current.record, sampler)
+                finally:
+                    current.record = None
+
+        return wrapper
+
+    return decorator
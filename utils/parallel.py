@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import numpy as np
+
+# Results only depend on the seed and the number of shards, never on how many
+# workers run them
+default_shards = 16
+default_workers = os.cpu_count() or 1
+
+executors = {}
+executors_lock = Lock()
+
+
+def get_executor(workers):
+    with executors_lock:
+        if workers not in executors:
+            executors[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="montecarlo"
+            )
+        return executors[workers]
+
+
+def spawn_generators(seed, shards):
+    sequences = np.random.SeedSequence(seed).spawn(shards)
+    return [np.random.default_rng(sequence) for sequence in sequences]
+
+
+def sharded_sampler(kernel, seed=None, shards=None, workers=None):
+    # Every shard fills its own rows of the shared chunk in place with an
+    # independent stream. NumPy releases the GIL while drawing and in the
+    # ufuncs, so the shards run on separate cores without copying the paths.
+    shards = default_shards if shards is None else shards
+    workers = default_workers if workers is None else workers
+
+    generators = spawn_generators(seed, shards)
+
+    def sample(data, start, stop):
+        bounds = np.linspace(0, len(data), shards + 1).astype(int)
+        jobs = [
+            (data[lower:upper], generator)
+            for lower, upper, generator in zip(bounds, bounds[1:], generators)
+            if upper > lower
+        ]
+
+        if workers == 1:
+            for rows, generator in jobs:
+                kernel(rows, start, stop, generator)
+            return
+
+        futures = [
+            get_executor(workers).submit(kernel, rows, start, stop, generator)
+            for rows, generator in jobs
+        ]
+        for future in futures:
+            future.result()
+
+    return sample
@@ -1,4 +1,9 @@
 import altair as alt
+import numpy as np
+import pandas as pd
+
+# Points per series sent to the browser, a 1600px wide chart cannot show more
+point_budget = 500
 
 
 def select_nearest():
@@ -12,31 +17,115 @@ def select_nearest():
     )
 
 
-def get_selectors(df, selection, x="x:Q"):
+# Layers are created without data and inherit the single dataset given to
+# alt.layer(..., data=df), which is serialized once for the whole chart
+
+
+def get_selectors(selection, x="x:Q"):
     return (
-        alt.Chart(df)
+        alt.Chart()
         .mark_point()
         .encode(x=x, opacity=alt.value(0))
         .add_selection(selection)
     )
 
 
-def add_text(chart, field, selection):
+def add_text(chart, field, selection, x="x"):
+    # "(x, y)" label built by the browser for the selected point only
+    label = f"'(' + datum.{x} + ', ' + format(datum.{field}, '.2f') + ')'"
     return (
         chart.mark_text(align="right", dx=-5, dy=-12, color="white", fontSize=18)
-        .encode(text=field)
         .transform_filter(selection)
+        .transform_calculate(coordinates=label)
+        .encode(text="coordinates:N")
     )
 
 
-def mark_years(df, x="x:Q"):
+def mark_years(days, x="x:Q"):
+    # Own tiny dataset with only the boundaries, nothing to filter client side
     return (
-        alt.Chart(df)
+        alt.Chart(pd.DataFrame({"x": np.arange(0, days, 365)}))
         .mark_rule(color="white")
         .encode(x=x, strokeDash=alt.value([5, 5]), strokeWidth=alt.value(2))
-        .transform_filter(alt.datum.x % 365 == 0)
     )
 
 
-def add_rules(df, selection, color="gray", x="x:Q"):
-    return alt.Chart(df).mark_rule(color=color).encode(x=x).transform_filter(selection)
+def add_rules(selection, color="gray", x="x:Q"):
+    return alt.Chart().mark_rule(color=color).encode(x=x).transform_filter(selection)
+
+
+def lttb_indices(values, budget):
+    # Largest-Triangle-Three-Buckets: from every bucket keep the point that
+    # spans the largest triangle with the last kept point and the average of
+    # the next bucket, which preserves the visual shape of the line
+    values = np.asarray(values, dtype=float)
+    points = len(values)
+    if points <= budget or budget < 3:
+        return np.arange(points)
+
+    positions = np.arange(points, dtype=float)
+    edges = np.linspace(1, points - 1, budget - 1).astype(int)
+
+    indices = np.empty(budget, dtype=np.intp)
+    indices[0], indices[-1] = 0, points - 1
+
+    selected = 0
+    for bucket in range(budget - 2):
+        lower, upper = edges[bucket], edges[bucket + 1]
+
+        if bucket + 2 < len(edges):
+            following = slice(upper, edges[bucket + 2])
+            next_x = positions[following].mean()
+            next_y = values[following].mean()
+        else:
+            next_x, next_y = positions[-1], values[-1]
+
+        x, y = positions[selected], values[selected]
+        areas = np.abs(
+            (x - next_x) * (values[lower:upper] - y)
+            - (x - positions[lower:upper]) * (next_y - y)
+        )
+        selected = lower + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+def minmax_indices(values, budget):
+    # Keeps the lowest and highest point of every bucket, cheaper than LTTB
+    # and never hides a spike
+    values = np.asarray(values, dtype=float)
+    points = len(values)
+    buckets = budget // 2
+    if points <= budget or buckets < 1:
+        return np.arange(points)
+
+    size = -(-points // buckets)
+    padded = np.pad(values, (0, size * buckets - points), mode="edge")
+    padded = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    indices = np.concatenate(
+        [offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1)]
+    )
+    return np.minimum(indices, points - 1)
+
+
+downsampling_methods = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+
+def downsample_indices(series, budget=None, keep=(), method="lttb"):
+    # Rows kept for all the series of a chart, so they still share the x
+    # values that the nearest selection snaps to. The budget is split among
+    # the series. First and last day, year boundaries (drawn by mark_years)
+    # and the given key points stay exact.
+    budget = point_budget if budget is None else budget
+    points = len(series[0])
+    share = max(3, budget // len(series))
+
+    selected = [downsampling_methods[method](values, share) for values in series]
+    years = np.arange(0, points, 365)
+    keep = np.asarray(keep, dtype=np.intp).ravel()
+    keep = keep[(keep >= 0) & (keep < points)]
+
+    return np.unique(np.concatenate([*selected, years, keep, [points - 1]]))
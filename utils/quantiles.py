@@ -0,0 +1,127 @@
+from statistics import NormalDist
+
+import numpy as np
+
+from utils.parallel import default_workers, get_executor
+
+# Bytes of simulated paths held at once by a single stream
+memory_budget = 64 * 2**20
+
+
+def partition_quantiles(data, quantiles):
+    # Linear interpolation as np.quantile does, but a single in-place
+    # partition serves every requested quantile
+    runs = len(data)
+    positions = np.asarray(quantiles, dtype=float) * (runs - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, runs - 1)
+
+    data.partition(np.union1d(lower, upper), axis=0)
+
+    fraction = (positions - lower)[:, None]
+    low = data[lower]
+    difference = data[upper] - low
+
+    return np.where(
+        fraction >= 0.5,
+        data[upper] - difference * (1 - fraction),
+        low + difference * fraction,
+    )
+
+
+def chunk_width(runs, budget=None, dtype=np.float64):
+    if budget is None:
+        budget = memory_budget
+
+    return max(1, int(budget // (runs * np.dtype(dtype).itemsize)))
+
+
+def stream_quantiles(
+    sample,
+    runs,
+    start,
+    stop,
+    quantiles,
+    budget=None,
+    dtype=np.float64,
+    workers=None,
+):
+    workers = default_workers if workers is None else workers
+
+    days = stop - start
+    chunk = min(chunk_width(runs, budget, dtype), days)
+
+    buffer = np.empty(runs * chunk, dtype=dtype)
+    bands = np.empty((len(quantiles), days))
+
+    for chunk_start in range(start, stop, chunk):
+        chunk_stop = min(chunk_start + chunk, stop)
+        width = chunk_stop - chunk_start
+
+        paths = buffer[: runs * width].reshape(runs, width)
+        sample(paths, chunk_start, chunk_stop)
+
+        chunk_bands = bands[:, chunk_start - start : chunk_stop - start]
+        if workers == 1 or width == 1:
+            chunk_bands[:] = partition_quantiles(paths, quantiles)
+            continue
+
+        # Columns are independent, each worker partitions a block of them
+        bounds = np.linspace(0, width, min(workers, width) + 1).astype(int)
+        futures = {
+            (lower, upper): get_executor(workers).submit(
+                partition_quantiles, paths[:, lower:upper], quantiles
+            )
+            for lower, upper in zip(bounds, bounds[1:])
+        }
+        for (lower, upper), future in futures.items():
+            chunk_bands[:, lower:upper] = future.result()
+
+    return bands
+
+
+def adaptive_runs(
+    sample, days, quantiles, tolerance, initial_runs=250, max_runs=20_000, probes=8
+):
+    # Doubles the runs drawn on a few probe days until no quantile moves more
+    # than the relative tolerance, narrow distributions settle in a few runs
+    probe_days = np.unique(np.linspace(0, days - 1, probes).astype(int))
+
+    drawn = np.empty((0, len(probe_days)))
+    estimate = None
+    runs = min(initial_runs, max_runs)
+
+    while True:
+        batch = np.empty((runs - len(drawn), len(probe_days)))
+        for column, day in enumerate(probe_days):
+            paths = np.empty((len(batch), 1))
+            sample(paths, day, day + 1)
+            batch[:, column] = paths[:, 0]
+        drawn = np.concatenate([drawn, batch])
+
+        previous, estimate = estimate, partition_quantiles(drawn.copy(), quantiles)
+        if previous is not None:
+            scale = np.maximum(np.abs(estimate), np.finfo(float).tiny)
+            if np.max(np.abs(estimate - previous) / scale) <= tolerance:
+                return runs
+
+        if runs >= max_runs:
+            return runs
+
+        runs = min(2 * runs, max_runs)
+
+
+def normal_quantile(quantiles, mean=0.0, deviation=1.0):
+    standard = np.array([NormalDist().inv_cdf(q) for q in np.ravel(quantiles)])
+    return mean + deviation * standard.reshape(np.shape(quantiles))
+
+
+def triangular_quantile(quantiles, low, mode, high):
+    quantiles = np.asarray(quantiles, dtype=float)
+    if high == low:
+        return np.full(quantiles.shape, float(low))
+
+    split = (mode - low) / (high - low)
+    rising = low + np.sqrt(quantiles * (high - low) * (mode - low))
+    falling = high - np.sqrt((1 - quantiles) * (high - low) * (high - mode))
+    return np.where(quantiles < split, rising, falling)
@@ -0,0 +1,71 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+# 1970-01-05 was the first Monday after the datetime64 epoch
+first_monday = 4
+
+
+def daily_events(dates):
+    return np.ones(len(dates), dtype=bool)
+
+
+def weekly_events(dates):
+    return (dates.astype(np.int64) - first_monday) % 7 == 0
+
+
+def biweekly_events(dates):
+    return (dates.astype(np.int64) - first_monday) % 14 == 0
+
+
+def monthly_events(dates):
+    return dates == dates.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def quarterly_events(dates):
+    months = dates.astype("datetime64[M]")
+    return monthly_events(dates) & (months.astype(np.int64) % 3 == 0)
+
+
+def annual_events(dates):
+    following = dates + 1
+    return following == following.astype("datetime64[Y]").astype("datetime64[D]")
+
+
+event_rules = {
+    "Annually": annual_events,
+    "Quarterly": quarterly_events,
+    "Monthly": monthly_events,
+    "Biweekly": biweekly_events,
+    "Weekly": weekly_events,
+    "Daily": daily_events,
+}
+
+
+class Schedule(NamedTuple):
+    frequency: str
+    start: np.datetime64
+    days: int
+    indices: np.ndarray
+
+    def mask(self):
+        mask = np.zeros(self.days, dtype=bool)
+        mask[self.indices] = True
+        return mask
+
+
+@lru_cache(maxsize=256)
+def cached_schedule(frequency, start, days):
+    if frequency not in event_rules:
+        raise ValueError(f"Unknown frequency: {frequency}")
+
+    dates = np.arange(start, start + days, dtype="datetime64[D]")
+    indices = np.flatnonzero(event_rules[frequency](dates))
+    indices.flags.writeable = False
+
+    return Schedule(frequency, start, days, indices)
+
+
+def compile_schedule(frequency, start, days):
+    return cached_schedule(str(frequency), np.datetime64(start, "D"), int(days))
@@ -0,0 +1,78 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class StreakIndex(NamedTuple):
+    # One entry per run of same-signed values, zeros and NaN end a streak
+    starts: np.ndarray
+    ends: np.ndarray
+    lengths: np.ndarray
+    signs: np.ndarray
+    # Sorted run lengths per sign, every query below is an index lookup
+    positive: np.ndarray
+    negative: np.ndarray
+    # Days covered by the runs of each sign, the mean needs no pass over them
+    positive_total: int
+    negative_total: int
+
+    def sorted_lengths(self, sign):
+        return self.positive if sign > 0 else self.negative
+
+    def total(self, sign):
+        return self.positive_total if sign > 0 else self.negative_total
+
+    def longest(self, sign):
+        lengths = self.sorted_lengths(sign)
+        return int(lengths[-1]) if len(lengths) else 0
+
+    def shortest(self, sign):
+        lengths = self.sorted_lengths(sign)
+        return int(lengths[0]) if len(lengths) else 0
+
+    def count(self, sign):
+        return len(self.sorted_lengths(sign))
+
+    def mean(self, sign):
+        count = self.count(sign)
+        return self.total(sign) / count if count else 0.0
+
+    def percentile(self, sign, percentile):
+        lengths = self.sorted_lengths(sign)
+        if not len(lengths):
+            return 0.0
+
+        position = percentile / 100 * (len(lengths) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(lengths) - 1)
+        fraction = position - lower
+        return float(lengths[lower] + (lengths[upper] - lengths[lower]) * fraction)
+
+    def histogram(self, sign):
+        # Number of runs for every length, index 0 is always empty
+        return np.bincount(self.sorted_lengths(sign))
+
+
+def streak_index(values):
+    values = np.asarray(values)
+    signs = (values > 0).view(np.int8) - (values < 0).view(np.int8)
+
+    changes = np.flatnonzero(signs[1:] != signs[:-1]) + 1
+    starts = np.concatenate([[0], changes]) if len(signs) else changes
+    ends = np.concatenate([changes, [len(signs)]]) if len(signs) else changes
+
+    lengths = ends - starts
+    run_signs = signs[starts]
+    positive = np.sort(lengths[run_signs > 0])
+    negative = np.sort(lengths[run_signs < 0])
+
+    return StreakIndex(
+        starts,
+        ends,
+        lengths,
+        run_signs,
+        positive,
+        negative,
+        int(positive.sum()),
+        int(negative.sum()),
+    )